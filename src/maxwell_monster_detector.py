@@ -15,27 +15,185 @@
 # Adjust --maxlag to capture longer-range dependencies if desired.
 # Adjust --window and --step to tune resolution/speed tradeoff.
 # Adjust --z and --cratio thresholds as desired to tune sensitivity.
-# Dependencies: Python 3.6+ (standard library only).
+# Dependencies: Python 3.8+ (standard library only; NumPy is used when importable).
 #
 
 import argparse
+import asyncio
+import bisect
 import csv
+import decimal
+import glob
+import hashlib
+import heapq
+import io
+import json
 import math
+import mmap
+import os
+import re
+import socketserver
+import stat
 import statistics
+import struct
 import sys
+import tempfile
+import threading
+import time
 import zlib
-from typing import List, Tuple, Optional
+from array import array
+from collections import Counter, OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import accumulate, chain, repeat
+from operator import add, sub
+from typing import Iterator, List, Tuple, Optional, Union
+from urllib.parse import parse_qsl, urlsplit
+
+
+if hasattr(int, "bit_count"):
+    def popcount(x: int) -> int:
+        return x.bit_count()
+else:  # Python < 3.10
+    def popcount(x: int) -> int:
+        return bin(x).count("1")
+
+
+# Bits of each byte value, MSB-first, used to expand packed data quickly.
+_BYTE_BITS = [tuple((b >> i) & 1 for i in range(7, -1, -1)) for b in range(256)]
+
+# Upper bound (in bits) on the size of a temporary int built by PackedBits.popcount.
+_POPCOUNT_CHUNK_BITS = 1 << 23
+
+
+class PackedBits:
+    # Read-only bit sequence over a bytes-like buffer (bits MSB-first per byte).
+    # Indexing is O(1), slicing returns a view over the same buffer at any bit
+    # offset, so a file costs about its own size in memory instead of a list
+    # of Python ints per bit.
+
+    __slots__ = ("_buf", "_off", "_len")
+
+    def __init__(self, data, offset: int = 0, length: Optional[int] = None):
+        buf = data if isinstance(data, memoryview) else memoryview(data)
+        if buf.ndim != 1 or buf.format != "B":
+            buf = buf.cast("B")
+        total = len(buf) * 8
+        if offset < 0 or offset > total:
+            raise ValueError(f"bit offset {offset} out of range for {total} bits")
+        if length is None:
+            length = total - offset
+        if length < 0 or offset + length > total:
+            raise ValueError(f"bit length {length} out of range at offset {offset}")
+        self._buf = buf
+        self._off = offset
+        self._len = length
+
+    @classmethod
+    def from_bitstring(cls, s: str) -> "PackedBits":
+        s = "".join(ch for ch in s if ch in "01")
+        n = len(s)
+        if n == 0:
+            return cls(b"")
+        pad = (-n) % 8
+        data = (int(s, 2) << pad).to_bytes((n + pad) // 8, "big")
+        return cls(data, 0, n)
+
+    @property
+    def buffer(self) -> memoryview:
+        return self._buf
+
+    @property
+    def offset(self) -> int:
+        return self._off
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __repr__(self) -> str:
+        return f"PackedBits(offset={self._off}, length={self._len})"
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, stride = key.indices(self._len)
+            if stride != 1:
+                raise ValueError("PackedBits slices must have step 1")
+            return PackedBits(self._buf, self._off + start, max(0, stop - start))
+        i = key.__index__()
+        if i < 0:
+            i += self._len
+        if i < 0 or i >= self._len:
+            raise IndexError("bit index out of range")
+        pos = self._off + i
+        return (self._buf[pos >> 3] >> (7 - (pos & 7))) & 1
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.tolist())
+
+    def tolist(self) -> List[int]:
+        if self._len == 0:
+            return []
+        lo = self._off >> 3
+        hi = (self._off + self._len + 7) >> 3
+        out = list(chain.from_iterable(map(_BYTE_BITS.__getitem__, self._buf[lo:hi])))
+        head = self._off - (lo << 3)
+        return out[head:head + self._len]
+
+    def _int_range(self, start: int, end: int) -> int:
+        # Bits [start, end) of this view as an int, first bit most significant.
+        if end <= start:
+            return 0
+        a = self._off + start
+        b = self._off + end
+        lo = a >> 3
+        hi = (b + 7) >> 3
+        v = int.from_bytes(self._buf[lo:hi], "big") >> ((hi << 3) - b)
+        return v & ((1 << (b - a)) - 1)
+
+    def to_int(self) -> int:
+        return self._int_range(0, self._len)
+
+    def popcount(self, start: int = 0, end: Optional[int] = None) -> int:
+        if end is None or end > self._len:
+            end = self._len
+        start = max(0, start)
+        total = 0
+        for s in range(start, end, _POPCOUNT_CHUNK_BITS):
+            total += popcount(self._int_range(s, min(end, s + _POPCOUNT_CHUNK_BITS)))
+        return total
+
+    def tobytes(self) -> bytes:
+        # Packed MSB-first, last byte zero-padded (same layout as bits_to_bytes).
+        n = self._len
+        if n == 0:
+            return b""
+        if self._off & 7 == 0:
+            lo = self._off >> 3
+            data = bytes(self._buf[lo:(self._off + n + 7) >> 3])
+            if n & 7:
+                data = data[:-1] + bytes([data[-1] & (0xFF << (8 - (n & 7))) & 0xFF])
+            return data
+        pad = (-n) % 8
+        return (self.to_int() << pad).to_bytes((n + pad) // 8, "big")
+
+    def view(self) -> Union[memoryview, bytes]:
+        # Same bytes as tobytes(), but a zero-copy slice of the source buffer
+        # when the view starts and ends on byte boundaries.
+        if (self._off | self._len) & 7 == 0:
+            lo = self._off >> 3
+            return self._buf[lo:lo + (self._len >> 3)]
+        return self.tobytes()
+
+
+BitSeq = Union[PackedBits, List[int]]
 
 
 def bytes_to_bits(data: bytes) -> List[int]:
-    out = []
-    for b in data:
-        for i in range(7, -1, -1):
-            out.append((b >> i) & 1)
-    return out
+    return PackedBits(data).tolist()
 
 
-def bits_to_bytes(bits: List[int]) -> bytes:
+def bits_to_bytes(bits: BitSeq) -> bytes:
+    if isinstance(bits, PackedBits):
+        return bits.tobytes()
     if not bits:
         return b""
     pad = (-len(bits)) % 8
@@ -49,11 +207,51 @@ def bits_to_bytes(bits: List[int]) -> bytes:
     return bytes(out)
 
 
-def binary_shannon_entropy(bits: List[int]) -> Tuple[float, float]:
-    n = len(bits)
+class PopcountIndex:
+    # Cumulative ones-count over a whole stream, one entry per block of
+    # block_bits. ones(start, end) costs two lookups plus popcounts of at most
+    # two partial blocks, so window entropy is O(1) in the window size.
+    # Blocks are counted on first use, so a scan over a large (memory-mapped)
+    # input starts right away and only touches data as the windows reach it.
+
+    def __init__(self, bits: PackedBits, block_bits: int = 4096):
+        if block_bits <= 0 or block_bits % 8:
+            raise ValueError("block_bits must be a positive multiple of 8")
+        self.bits = bits
+        self.block_bits = block_bits
+        self._cum = array("Q", [0])
+
+    def _extend(self, blk: int) -> None:
+        cum = self._cum
+        n = len(self.bits)
+        bb = self.block_bits
+        total = cum[-1]
+        s = (len(cum) - 1) * bb
+        while len(cum) <= blk:
+            total += self.bits.popcount(s, min(n, s + bb))
+            cum.append(total)
+            s += bb
+
+    def prefix(self, i: int) -> int:
+        # Number of ones in bits [0, i).
+        blk, rem = divmod(i, self.block_bits)
+        if blk >= len(self._cum):
+            self._extend(blk)
+        c = self._cum[blk]
+        if rem:
+            c += self.bits.popcount(i - rem, i)
+        return c
+
+    def ones(self, start: int, end: int) -> int:
+        return self.prefix(end) - self.prefix(start)
+
+    def entropy(self, start: int, end: int) -> Tuple[float, float]:
+        return entropy_from_counts(self.ones(start, end), end - start)
+
+
+def entropy_from_counts(ones: int, n: int) -> Tuple[float, float]:
     if n == 0:
         return 0.0, 0.0
-    ones = sum(bits)
     p1 = ones / n
     p0 = 1.0 - p1
     h = 0.0
@@ -64,25 +262,55 @@ def binary_shannon_entropy(bits: List[int]) -> Tuple[float, float]:
     return h, p1
 
 
-def mutual_information_lag(bits: List[int], lag: int) -> float:
+def binary_shannon_entropy(bits: BitSeq) -> Tuple[float, float]:
     n = len(bits)
-    if lag <= 0 or n <= lag:
-        return 0.0
+    if n == 0:
+        return 0.0, 0.0
+    ones = bits.popcount() if isinstance(bits, PackedBits) else sum(bits)
+    return entropy_from_counts(ones, n)
 
-    c00 = c01 = c10 = c11 = 0
-    for i in range(n - lag):
-        a = bits[i]
-        b = bits[i + lag]
-        if a == 0 and b == 0:
-            c00 += 1
-        elif a == 0 and b == 1:
-            c01 += 1
-        elif a == 1 and b == 0:
-            c10 += 1
-        else:
-            c11 += 1
 
+def bits_as_int(bits: BitSeq) -> Tuple[int, int]:
+    # (value, length) with the first bit most significant.
+    if isinstance(bits, PackedBits):
+        return bits.to_int(), len(bits)
+    n = len(bits)
+    if n == 0:
+        return 0, 0
+    return int("".join("1" if b else "0" for b in bits), 2), n
+
+
+def lag_pair_counts(x: int, n: int, lag: int,
+                    ones_head: Optional[int] = None,
+                    ones_tail: Optional[int] = None) -> Tuple[int, int, int, int]:
+    # 2x2 contingency counts (c00, c01, c10, c11) of (bit[i], bit[i+lag]) for
+    # i < n - lag, where x holds n bits first-bit-most-significant. Only c11
+    # needs a word-level AND + popcount; the rest follow from the marginals
+    # ones_head = ones in bits[0:n-lag] and ones_tail = ones in bits[lag:n].
     m = n - lag
+    head = x >> lag
+    tail = x & ((1 << m) - 1)
+    c11 = popcount(head & tail)
+    if ones_head is None:
+        ones_head = popcount(head)
+    if ones_tail is None:
+        ones_tail = popcount(tail)
+    c10 = ones_head - c11
+    c01 = ones_tail - c11
+    c00 = m - c11 - c10 - c01
+    return c00, c01, c10, c11
+
+
+def _mi_term(pxy: float, px: float, py: float) -> float:
+    if pxy <= 0.0 or px <= 0.0 or py <= 0.0:
+        return 0.0
+    return pxy * math.log2(pxy / (px * py))
+
+
+def mi_from_counts(c00: int, c01: int, c10: int, c11: int) -> float:
+    m = c00 + c01 + c10 + c11
+    if m == 0:
+        return 0.0
     p00 = c00 / m
     p01 = c01 / m
     p10 = c10 / m
@@ -93,27 +321,980 @@ def mutual_information_lag(bits: List[int], lag: int) -> float:
     pb0 = (c00 + c10) / m
     pb1 = (c01 + c11) / m
 
-    def term(pxy: float, px: float, py: float) -> float:
-        if pxy <= 0.0 or px <= 0.0 or py <= 0.0:
-            return 0.0
-        return pxy * math.log2(pxy / (px * py))
-
     mi = 0.0
-    mi += term(p00, pa0, pb0)
-    mi += term(p01, pa0, pb1)
-    mi += term(p10, pa1, pb0)
-    mi += term(p11, pa1, pb1)
+    mi += _mi_term(p00, pa0, pb0)
+    mi += _mi_term(p01, pa0, pb1)
+    mi += _mi_term(p10, pa1, pb0)
+    mi += _mi_term(p11, pa1, pb1)
     return mi
 
 
-def compress_ratio_bytes(payload: bytes, level: int = 9) -> float:
-    if not payload:
+def mutual_information_lag(bits: BitSeq, lag: int) -> float:
+    n = len(bits)
+    if lag <= 0 or n <= lag:
+        return 0.0
+    x, n = bits_as_int(bits)
+    return mi_from_counts(*lag_pair_counts(x, n, lag))
+
+
+def mutual_information_lags(bits: BitSeq, maxlag: int) -> List[float]:
+    # MI for lags 1..maxlag from one int conversion of the window. The
+    # marginals shrink by one bit per lag, so they are updated, not recounted.
+    x, n = bits_as_int(bits)
+    ones_head = ones_tail = popcount(x)
+    out = []
+    for k in range(1, maxlag + 1):
+        if k >= n:
+            out.append(0.0)
+            continue
+        ones_head -= (x >> (k - 1)) & 1  # drops bit[n-k]
+        ones_tail -= (x >> (n - k)) & 1  # drops bit[k-1]
+        out.append(mi_from_counts(*lag_pair_counts(x, n, k, ones_head, ones_tail)))
+    return out
+
+
+class SlidingPairCounts:
+    # Per-lag contingency counts for a window sliding over a PackedBits stream.
+    # Only c11 is carried: moving the window adds the pairs that enter on the
+    # right and removes the ones that leave on the left, and c00/c01/c10 are
+    # derived from prefix-index marginals. A step then costs O(step * maxlag)
+    # bits of word-level work instead of O(window * maxlag). Non-overlapping
+    # or backward moves fall back to a full recount.
+
+    def __init__(self, bits: PackedBits, win: int, maxlag: int,
+                 index: Optional[PopcountIndex] = None):
+        self.bits = bits
+        self.win = win
+        self.maxlag = maxlag
+        self.index = index if index is not None else PopcountIndex(bits)
+        self.start = None  # type: Optional[int]
+        self._c11 = [0] * (maxlag + 1)
+
+    def move_to(self, start: int) -> None:
+        win = self.win
+        top = min(self.maxlag, win - 1)
+        prev = self.start
+        self.start = start
+        if top <= 0:
+            return
+        d = start - prev if prev is not None else -1
+        if 0 <= d < win - top:
+            if d == 0:
+                return
+            # Pairs leaving start in [prev, start), pairs entering start in
+            # [prev + win - k, start + win - k); one int spans each edge.
+            mask = (1 << d) - 1
+            leave = self.bits[prev:start + top].to_int()
+            enter = self.bits[prev + win - top:start + win].to_int()
+            first_out = leave >> top
+            for k in range(1, top + 1):
+                self._c11[k] += (popcount((enter >> k) & enter & mask)
+                                 - popcount(first_out & (leave >> (top - k))))
+        else:
+            x = self.bits[start:start + win].to_int()
+            for k in range(1, top + 1):
+                self._c11[k] = popcount((x >> k) & x & ((1 << (win - k)) - 1))
+
+    def mutual_information(self) -> List[float]:
+        s = self.start
+        win = self.win
+        top = min(self.maxlag, win - 1)
+        out = []
+        if top > 0:
+            # Marginals shrink by one edge bit per lag, as in mutual_information_lags.
+            ones_head = ones_tail = self.index.ones(s, s + win)
+            first = self.bits[s:s + top].to_int()
+            last = self.bits[s + win - top:s + win].to_int()
+            for k in range(1, top + 1):
+                ones_head -= (last >> (k - 1)) & 1
+                ones_tail -= (first >> (top - k)) & 1
+                c11 = self._c11[k]
+                c10 = ones_head - c11
+                c01 = ones_tail - c11
+                out.append(mi_from_counts(win - k - c11 - c10 - c01, c01, c10, c11))
+        out.extend([0.0] * (self.maxlag - len(out)))
+        return out
+
+
+class PairCountIndex:
+    # Cumulative per-lag c11 counts (pairs with bit[j] = bit[j+lag] = 1, by j)
+    # at block granularity, the pair-count counterpart of PopcountIndex. c11
+    # of any window and lag is two lookups plus two partial-block popcounts,
+    # so it costs the same for every window size and step, and one index
+    # serves every scale of a multi-window scan. Blocks are counted lazily,
+    # all lags from a single int per block.
+
+    def __init__(self, bits: PackedBits, maxlag: int, block_bits: int = 4096):
+        if block_bits <= 0 or block_bits % 8:
+            raise ValueError("block_bits must be a positive multiple of 8")
+        self.bits = bits
+        self.maxlag = maxlag
+        self.block_bits = block_bits
+        self._cum = [array("Q", [0]) for _ in range(maxlag + 1)]
+
+    def _extend(self, blk: int) -> None:
+        n = len(self.bits)
+        bb = self.block_bits
+        cum = self._cum
+        s = (len(cum[0]) - 1) * bb
+        while len(cum[0]) <= blk:
+            x = self.bits[s:min(n, s + bb + self.maxlag)].to_int()
+            span = min(n, s + bb + self.maxlag) - s
+            cum[0].append(0)
+            for k in range(1, self.maxlag + 1):
+                m = min(bb, span - k)
+                if m <= 0:
+                    cum[k].append(cum[k][-1])
+                    continue
+                head = x >> (span - m)
+                tail = (x >> (span - m - k)) & ((1 << m) - 1)
+                cum[k].append(cum[k][-1] + popcount(head & tail))
+            s += bb
+
+    def prefix(self, lag: int, i: int) -> int:
+        # Number of pairs (j, j + lag) of ones with j < i, for i <= len - lag.
+        blk, rem = divmod(i, self.block_bits)
+        if blk >= len(self._cum[0]):
+            self._extend(blk)
+        c = self._cum[lag][blk]
+        if rem:
+            x = self.bits[i - rem:i + lag].to_int()
+            c += popcount((x >> lag) & x & ((1 << rem) - 1))
+        return c
+
+    def c11(self, lag: int, start: int, end: int) -> int:
+        # Pairs of ones at distance lag inside bits [start, end).
+        if end - start <= lag:
+            return 0
+        return self.prefix(lag, end - lag) - self.prefix(lag, start)
+
+    def mutual_information(self, index: PopcountIndex, start: int, win: int,
+                           maxlag: Optional[int] = None) -> List[float]:
+        # All lags at once: one int from the block holding start (pairs before
+        # start) and one from the block holding end - top (pairs before end - k
+        # for every k), with marginals shrunk by edge bits as elsewhere.
+        # maxlag may be lower than the index's own.
+        if maxlag is None:
+            maxlag = self.maxlag
+        end = start + win
+        top = min(maxlag, win - 1)
+        out = []
+        if top > 0:
+            bb = self.block_bits
+            bs = start - start % bb
+            be = (end - top) - (end - top) % bb
+            if max(bs, be) // bb >= len(self._cum[0]):
+                self._extend(max(bs, be) // bb)
+            rs = start - bs
+            xs = self.bits[bs:start + top].to_int()
+            xe = self.bits[be:end].to_int()
+            ms = (1 << rs) - 1
+            le = end - be
+            ones_head = ones_tail = index.ones(start, end)
+            first = xs & ((1 << top) - 1)
+            last = xe & ((1 << top) - 1)
+            for k in range(1, top + 1):
+                before = self._cum[k][bs // bb] + popcount((xs >> top) & (xs >> (top - k)) & ms)
+                upto = self._cum[k][be // bb] + popcount((xe >> k) & xe & ((1 << (le - k)) - 1))
+                c11 = upto - before
+                ones_head -= (last >> (k - 1)) & 1
+                ones_tail -= (first >> (top - k)) & 1
+                c10 = ones_head - c11
+                c01 = ones_tail - c11
+                out.append(mi_from_counts(win - k - c11 - c10 - c01, c01, c10, c11))
+        out.extend([0.0] * (maxlag - len(out)))
+        return out
+
+
+# --- SP 800-22 battery ------------------------------------------------------
+#
+# Per-window p-values for the NIST SP 800-22 frequency, block frequency,
+# runs, longest run of ones, serial (m = 2), approximate entropy (m = 1) and
+# cumulative sums tests. Everything is counted at word level, never bit by
+# bit: ones and lag-1 pairs (behind runs, serial and approximate entropy;
+# the cyclic pattern counts only add the wrap-around pair) are popcounts of
+# the window as one int, the longest-run classes a few masked shift-ANDs of
+# it, and block frequency and cumulative sums come from a walk of the whole
+# stream that is shared by all overlapping windows (see RandomnessBattery).
+
+NIST_TESTS = ("frequency", "block_frequency", "runs", "longest_run", "serial1", "serial2",
+              "approx_entropy", "cusum_forward", "cusum_reverse")
+
+# Per byte value: +8 + net walk step, and the walk's highest / -lowest
+# prefix sum (prefixes include the empty one).
+_WALK_DELTA = bytearray(256)
+_WALK_HIGH = bytearray(256)
+_WALK_LOW = bytearray(256)
+for _v in range(256):
+    _s = _hi = _lo = 0
+    for _j in range(7, -1, -1):
+        _s += 1 if (_v >> _j) & 1 else -1
+        _hi = max(_hi, _s)
+        _lo = min(_lo, _s)
+    _WALK_DELTA[_v], _WALK_HIGH[_v], _WALK_LOW[_v] = _s + 8, _hi, -_lo
+_WALK_DELTA, _WALK_HIGH, _WALK_LOW = bytes(_WALK_DELTA), bytes(_WALK_HIGH), bytes(_WALK_LOW)
+del _v, _s, _hi, _lo, _j
+
+# Longest-run-of-ones parameters by window size (SP 800-22 2.4.2): minimum
+# n, block size M, upper bounds of the first and last classes, and the
+# class probabilities.
+_LONGEST_RUN = (
+    (750000, 10000, 10, 16, (0.0882, 0.2092, 0.2483, 0.1933, 0.1208, 0.0675, 0.0727)),
+    (6272, 128, 4, 9, (0.1174, 0.2430, 0.2493, 0.1752, 0.1027, 0.1124)),
+    (128, 8, 1, 4, (0.2148, 0.3672, 0.2305, 0.1875)),
+)
+
+
+def igamc(a: float, x: float) -> float:
+    # Regularized upper incomplete gamma Q(a, x). Integer and half-integer a
+    # (every use here) have finite sums; otherwise a series for x < a + 1 and
+    # a Lentz continued fraction above (Numerical Recipes 6.2).
+    if x <= 0.0:
+        return 1.0
+    if 2 * a == int(2 * a) and a <= 128 and x < 700.0:
+        if a == int(a):
+            term = total = math.exp(-x)
+            for k in range(1, int(a)):
+                term *= x / k
+                total += term
+            return min(1.0, total)
+        total = math.erfc(math.sqrt(x))
+        term = math.exp(-x) * math.sqrt(x) / math.gamma(1.5)
+        k = 1.5
+        while k <= a:
+            total += term
+            term *= x / k
+            k += 1.0
+        return min(1.0, total)
+    lead = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1.0:
+        term = total = 1.0 / a
+        ap = a
+        for _ in range(1000):
+            ap += 1.0
+            term *= x / ap
+            total += term
+            if abs(term) < abs(total) * 1e-15:
+                break
+        return max(0.0, 1.0 - total * math.exp(lead))
+    tiny = 1e-300
+    b = x + 1.0 - a
+    c = 1.0 / tiny
+    d = 1.0 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2.0
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1.0 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 1e-15:
+            break
+    return math.exp(lead) * h
+
+
+def cusum_pvalue(z: int, n: int) -> float:
+    # SP 800-22 2.13.4 for maximum excursion z of an n-step walk. Terms whose
+    # normal arguments lie beyond +-10 are 0 to double precision and skipped;
+    # the rest need the normal CDF at odd multiples of z / sqrt(n) only.
+    t = z / math.sqrt(n)
+    reach = int((10.0 / t + 3.0) / 4.0) + 1
+    hi = min(int((n / z - 1) / 4), reach)
+    lo1 = max(int((-n / z + 1) / 4), -reach)
+    lo3 = max(int((-n / z - 3) / 4), -reach)
+    j0 = min(4 * lo1 - 1, 4 * lo3 + 1)
+    c = -t / math.sqrt(2.0)
+    cdf = [0.5 * math.erfc(j * c) for j in range(j0, 4 * hi + 4, 2)]
+    total = 1.0
+    for k in range(lo1, hi + 1):
+        i = (4 * k - j0) >> 1
+        total -= cdf[i + 1] - cdf[i]
+    for k in range(lo3, hi + 1):
+        i = (4 * k - j0) >> 1
+        total += cdf[i + 2] - cdf[i + 1]
+    return min(1.0, max(0.0, total))
+
+
+def _plogp(counts, n: int) -> float:
+    return sum(c / n * math.log(c / n) for c in counts if c)
+
+
+def _walk(data: bytes, base: int = 0) -> Tuple[List[int], List[int], List[int]]:
+    # Walk value before each byte of data (and after the last), and the
+    # highest / lowest partial sum reached within each byte.
+    walk = list(accumulate(map(sub, data.translate(_WALK_DELTA), repeat(8)), initial=base))
+    return walk, list(map(add, walk, data.translate(_WALK_HIGH))), list(map(sub, walk, data.translate(_WALK_LOW)))
+
+
+def _narrow(v: int, count: int, w: int) -> int:
+    # count fields of 2w bits holding values below 2^w, repacked as w-bit lanes.
+    wb = w >> 3
+    raw = v.to_bytes(2 * wb * count, "big")
+    out = bytearray(wb * count)
+    for k in range(wb):
+        out[k::wb] = raw[wb + k::2 * wb]
+    return int.from_bytes(out, "big")
+
+
+def _lane_values(v: int, count: int, w: int) -> array:
+    code = next(t for t in "BHILQ" if array(t).itemsize == w >> 3)
+    out = array(code, v.to_bytes(count * (w >> 3), "big"))
+    if sys.byteorder == "little":
+        out.byteswap()
+    return out
+
+
+def _walk_extremes(data: bytes, block_bytes: int) -> Tuple[List[int], array, array]:
+    # Net step, highest and -lowest partial sum (prefixes include the empty
+    # one) of the walk within each block_bytes block of data, block_bytes a
+    # power of two. Adjacent segments a, b merge as
+    #     step = step_a + step_b
+    #     high = max(high_a, step_a + high_b)
+    #     low = min(low_a, step_a + low_b)
+    # for all lanes of one big int at a time: steps carry a bias of 8 per
+    # byte of segment so every lane stays non-negative, and a max is a
+    # guard-bit subtraction per lane. Lanes start at 8 bits; a merge leaves
+    # each result in a field twice as wide, which is kept as the new lane
+    # width once 3 * bias (the largest value compared) would reach the
+    # guard bit, and narrowed back otherwise.
+    count = len(data)
+    w = 8
+    s = int.from_bytes(data.translate(_WALK_DELTA), "big")
+    h = int.from_bytes(data.translate(_WALK_HIGH), "big")
+    lo = int.from_bytes(data.translate(_WALK_LOW), "big")
+    off = 8
+    while count > len(data) // block_bytes:
+        count >>= 1
+        unit = int.from_bytes((bytes((w >> 2) - 1) + b"\1") * count, "big")
+        mask = unit * ((1 << w) - 1)
+        guard = unit << (w - 1)
+        bias = unit * off
+        sa = (s >> w) & mask
+        x = ((h >> w) & mask) + bias
+        y = sa + (h & mask)
+        ge = ((x | guard) - y) & guard
+        h = (y ^ ((x ^ y) & (ge - (ge >> (w - 1))))) - bias
+        x = ((lo >> w) & mask) + bias
+        y = (bias << 1) - sa + (lo & mask)
+        ge = ((x | guard) - y) & guard
+        lo = (y ^ ((x ^ y) & (ge - (ge >> (w - 1))))) - bias
+        s = sa + (s & mask)
+        off <<= 1
+        if 3 * off >= 1 << (w - 1):
+            w <<= 1
+        else:
+            s, h, lo = (_narrow(v, count, w) for v in (s, h, lo))
+    return ([v - off for v in _lane_values(s, count, w)],
+            _lane_values(h, count, w), _lane_values(lo, count, w))
+
+
+class RandomnessBattery:
+    # p-values of NIST_TESTS for any window [start, end) of a stream; index
+    # may be the one a scan already shares. Tests whose minimum length the
+    # window misses report nan.
+    #
+    # Block frequency and cumulative sums need the +-1 walk of the window.
+    # It is walked once for the whole stream, lazily like PopcountIndex:
+    # per WALK_BITS block the highest and lowest walk value (merged with
+    # _walk_extremes), and per block_bits block the squared
+    # (2 * ones - block_bits) of block frequency. A byte-aligned window then
+    # costs slices of those arrays plus byte walks of its partial edge
+    # blocks, instead of a walk of every bit once per overlapping window.
+    # Windows off the block grid are walked whole.
+    #
+    # As a CSV column provider (see format_row), any p-value below alpha
+    # flags the window.
+
+    WALK_BITS = 512
+    columns = tuple(f"p_{t}" for t in NIST_TESTS)
+
+    def __init__(self, bits: PackedBits, index: Optional[PopcountIndex] = None, block_bits: int = 128,
+                 alpha: float = 0.001):
+        if block_bits <= 0 or block_bits % 8:
+            raise ValueError("block_bits must be a positive multiple of 8")
+        self.bits = bits
+        self.index = index if index is not None else PopcountIndex(bits)
+        self.block_bits = block_bits
+        self.alpha = alpha
+        self._high = array("q")
+        self._low = array("q")
+        self._sq = array("Q")
+        self._masks = {}
+
+    def _extend(self, blk: int) -> None:
+        # Walk whole WALK_BITS blocks, a batch of bytes at a time, until blk
+        # is covered. Batches are a multiple of both block sizes, so the
+        # block frequency grid stays aligned.
+        wb = self.WALK_BITS >> 3
+        mb = self.block_bits >> 3
+        unit = wb * mb // math.gcd(wb, mb)
+        per = unit * max(1, (1 << 16) // unit)
+        nbytes = len(self.bits) >> 3
+        while len(self._high) <= blk and (len(self._high) + 1) * wb <= nbytes:
+            s = len(self._high) * wb
+            data = bytes(self.bits[s << 3:min(nbytes, s + per) << 3].view())
+            steps, high, low = _walk_extremes(data[:len(data) - len(data) % wb], wb)
+            edges = list(accumulate(steps, initial=2 * self.index.prefix(s << 3) - (s << 3)))
+            self._high.extend(map(add, edges, high))
+            self._low.extend(map(sub, edges, low))
+            m = self.block_bits
+            self._sq.extend((2 * popcount(int.from_bytes(data[i:i + mb], "big")) - m) ** 2
+                            for i in range(0, len(data) - mb + 1, mb))
+
+    def _walk_stats(self, start: int, end: int) -> Tuple[int, int, Optional[float]]:
+        # (highest, lowest) partial sum of the window's walk and its block
+        # frequency chi-square (None when the window has no whole block).
+        n = end - start
+        m = self.block_bits
+        g = self.WALK_BITS
+        ga = -(-start // g)
+        gb = end // g
+        if start % 8 or n % 8 or start % m or gb - ga < 1:
+            data = bytes(self.bits[start:start + (n & ~7)].view())
+            walk, high, low = _walk(data)
+            high = max(high)
+            low = min(low)
+            if n & 7:
+                s = walk[-1]
+                for b in self.bits[start + len(data) * 8:end]:
+                    s += 1 if b else -1
+                    high = max(high, s)
+                    low = min(low, s)
+            nblocks = n // m
+            if not nblocks:
+                return high, low, None
+            edges = walk[:nblocks * (m >> 3) + 1:m >> 3]
+            return high, low, sum(d * d for d in map(sub, edges[1:], edges[:-1])) / m
+
+        if gb > len(self._high):
+            self._extend(gb - 1)
+        base = 2 * self.index.prefix(start) - start
+        high = max(self._high[ga:gb])
+        low = min(self._low[ga:gb])
+        if start < ga * g:
+            _, h, l = _walk(bytes(self.bits[start:ga * g].view()), base)
+            high = max(high, max(h))
+            low = min(low, min(l))
+        if gb * g < end:
+            _, h, l = _walk(bytes(self.bits[gb * g:end].view()), 2 * self.index.prefix(gb * g) - gb * g)
+            high = max(high, max(h))
+            low = min(low, min(l))
+        nblocks = n // m
+        chi2 = None
+        if nblocks:
+            b0 = start // m
+            if b0 + nblocks <= len(self._sq):
+                chi2 = sum(self._sq[b0:b0 + nblocks]) / m
+            else:
+                # The last blocks run past the walked grid: count them here.
+                edges = [2 * self.index.prefix(start + i * m) - (start + i * m)
+                         for i in range(len(self._sq) - b0, nblocks + 1)]
+                chi2 = (sum(self._sq[b0:]) + sum(d * d for d in map(sub, edges[1:], edges[:-1]))) / m
+        return high - base, low - base, chi2
+
+    def _run_masks(self, nblocks: int, m: int) -> Tuple[int, int, int]:
+        # For nblocks blocks of m bits in one int: every bit but the top of
+        # the blocks below the first, the top bit of every block, and each
+        # block's bits below its top.
+        key = (nblocks, m)
+        if key not in self._masks:
+            top = sum(1 << (j * m + m - 1) for j in range(nblocks))
+            low = top >> (m - 1)
+            self._masks[key] = (~(top >> m), top, top - low)
+        return self._masks[key]
+
+    def _longest_run(self, x: int, n: int) -> float:
+        for min_n, m, first, last, probs in _LONGEST_RUN:
+            if n >= min_n:
+                break
+        else:
+            return math.nan
+        nblocks = n // m
+        x >>= (n - nblocks * m)
+        keep, top, below = self._run_masks(nblocks, m)
+        # z has a bit set where a run of at least k ones starts inside its
+        # block. A block of z is non-zero iff its top bit is set or adding
+        # 2^(m-1) - 1 to the rest carries into it; no carry leaves a block.
+        z = x
+        at_least = []
+        for k in range(2, last + 1):
+            z &= (z >> 1) & keep
+            if k > first:
+                at_least.append(popcount((((z & below) + below) | z) & top))
+        nu = [nblocks - at_least[0]]
+        nu += [at_least[i] - at_least[i + 1] for i in range(len(at_least) - 1)]
+        nu.append(at_least[-1])
+        chi2 = sum((v - nblocks * q) ** 2 / (nblocks * q) for v, q in zip(nu, probs))
+        return igamc((len(probs) - 1) / 2.0, chi2 / 2.0)
+
+    def pvalues(self, start: int, end: int) -> List[float]:
+        n = end - start
+        if n < 2:
+            return [math.nan] * len(NIST_TESTS)
+        # The window as one int (needed for the longest run anyway) gives
+        # its ones and lag-1 pairs with one popcount each.
+        x = self.bits[start:end].to_int()
+        ones = popcount(x)
+        zeros = n - ones
+        out = []
+
+        # Frequency.
+        s_n = 2 * ones - n
+        out.append(math.erfc(abs(s_n) / math.sqrt(2.0 * n)))
+
+        # Block frequency.
+        high, low, chi2 = self._walk_stats(start, end)
+        out.append(math.nan if chi2 is None else igamc((n // self.block_bits) / 2.0, chi2 / 2.0))
+
+        # Lag-1 pair counts, linear and with the wrap-around pair.
+        first = x >> (n - 1)
+        last = x & 1
+        c11 = popcount(x & (x >> 1))
+        c10 = ones - last - c11
+        c01 = ones - first - c11
+        c00 = n - 1 - c11 - c10 - c01
+        cyc = [c00, c01, c10, c11]
+        cyc[2 * last + first] += 1
+
+        # Runs.
+        pi = ones / n
+        if abs(pi - 0.5) >= 2.0 / math.sqrt(n):
+            out.append(0.0)
+        else:
+            v = c01 + c10 + 1
+            out.append(math.erfc(abs(v - 2.0 * n * pi * (1.0 - pi))
+                                 / (2.0 * math.sqrt(2.0 * n) * pi * (1.0 - pi))))
+
+        # Longest run of ones in a block.
+        out.append(self._longest_run(x, n))
+
+        # Serial (m = 2): psi^2_2 - psi^2_1 and psi^2_2 - 2 psi^2_1 + psi^2_0.
+        psi2 = 4.0 / n * sum(c * c for c in cyc) - n
+        psi1 = 2.0 / n * (ones * ones + zeros * zeros) - n
+        out.append(math.exp(-(psi2 - psi1) / 2.0))
+        out.append(math.erfc(math.sqrt(max(0.0, psi2 - 2.0 * psi1) / 2.0)))
+
+        # Approximate entropy (m = 1).
+        apen = _plogp((zeros, ones), n) - _plogp(cyc, n)
+        out.append(math.exp(-n * (math.log(2.0) - apen)))
+
+        # Cumulative sums, forward and reverse.
+        out.append(cusum_pvalue(max(high, -low), n))
+        out.append(cusum_pvalue(max(s_n - low, high - s_n), n))
+        return out
+
+    def cells(self, start: int, end: int) -> Tuple[List[str], bool]:
+        pvalues = self.pvalues(start, end)
+        return [f"{p:.6f}" for p in pvalues], any(p < self.alpha for p in pvalues)
+
+
+# --- Linear complexity -----------------------------------------------------
+#
+# The length of the shortest LFSR that generates a window, by Berlekamp-Massey
+# over GF(2) with the window and the connection polynomials as big ints.
+# A random n-bit window has complexity close to n/2; an LFSR stream such as
+# gen_testbins' PRBS has its register length, however random it looks to the
+# entropy, MI and compression metrics.
+
+def lfsr_residue(x: int, c: int, k: int, degree: int) -> int:
+    # Discrepancies of the LFSR with connection polynomial c (bit i is the
+    # tap on the bit i places back) against the bits of x below bit k + 1:
+    # bit p of the result is set where the bit of x at p differs from the
+    # LFSR's prediction from the degree bits above it. One shifted XOR per
+    # tap instead of one parity per predicted bit.
+    y = x & ((1 << (k + 1 + degree)) - 1)
+    r = 0
+    while c:
+        low = c & -c
+        r ^= y >> (low.bit_length() - 1)
+        c ^= low
+    return r & ((1 << (k + 1)) - 1)
+
+
+def berlekamp_massey(x: int, n: int, quiet: int = 32) -> Tuple[int, int]:
+    # (linear complexity, connection polynomial) of the n bits of x, first
+    # bit at the top. Once the LFSR has predicted quiet bits in a row the
+    # rest of the window is checked in one lfsr_residue and the loop jumps
+    # to the next discrepancy, so a low-complexity window costs about 2L
+    # steps plus that check; a random one still costs O(n^2 / word) bit ops.
+    c = b = 1
+    length = 0
+    m = 1
+    run = 0
+    k = n - 1  # x >> k puts the current bit at bit 0
+    while k >= 0:
+        if not popcount((x >> k) & c) & 1:
+            m += 1
+            k -= 1
+            run += 1
+            if run >= quiet and k >= 0:
+                r = lfsr_residue(x, c, k, length)
+                if not r:
+                    break
+                m += k + 1 - r.bit_length()
+                k = r.bit_length() - 1
+                run = 0
+            continue
+        run = 0
+        if 2 * length < n - k:
+            b, c = c, c ^ (b << m)
+            length = n - k - length
+            m = 1
+        else:
+            c ^= b << m
+            m += 1
+        k -= 1
+    return length, c
+
+
+class LinearComplexity:
+    # The linear_complexity column for any window [start, end) of a stream.
+    # A window is flagged when its complexity is more than margin below
+    # n/2 (a random window falls that far short with odds around 4^-margin).
+    #
+    # Windows are expected in scan order. The previous window's LFSR is kept,
+    # and when the next window overlaps it only the bits that entered are
+    # checked against it; if they agree, a Berlekamp-Massey run over the
+    # first 2L bits of the new window confirms that no shorter LFSR appeared
+    # when bits left. Only a window that breaks the LFSR is solved from
+    # scratch.
+
+    columns = ("linear_complexity",)
+
+    def __init__(self, bits: PackedBits, margin: int = 16):
+        self.bits = bits
+        self.margin = margin
+        self._state = None  # (start, end, complexity, connection polynomial)
+
+    def complexity(self, start: int, end: int) -> int:
+        n = end - start
+        x = self.bits[start:end].to_int()
+        if self._state is not None:
+            s0, e0, length, c = self._state
+            if s0 <= start < e0 and 2 * length <= n:
+                # Positions below start + length have no full history to check.
+                first = max(min(e0, end), start + length)
+                if first >= end or not lfsr_residue(x, c, end - 1 - first, length):
+                    if berlekamp_massey(x >> (n - 2 * length), 2 * length)[0] == length:
+                        self._state = (start, end, length, c)
+                        return length
+        length, c = berlekamp_massey(x, n)
+        self._state = (start, end, length, c)
+        return length
+
+    def cells(self, start: int, end: int) -> Tuple[List[str], bool]:
+        length = self.complexity(start, end)
+        return [str(length)], length < (end - start) // 2 - self.margin
+
+
+# --- Long-range autocorrelation --------------------------------------------
+#
+# c11 for every lag at once: the pair counts of lag k are a cross-correlation
+# of the bits with themselves, so one transform replaces a pass per lag.
+# With NumPy that is an rfft; without it, the bits become decimal fields of a
+# Decimal and libmpdec's number-theoretic-transform multiply does the
+# convolution exactly. Long spans are cut into blocks of at least maxlag
+# bits, each correlated with itself plus the maxlag bits after it, so time is
+# O(n log maxlag) and memory O(maxlag).
+
+_AUTOCORR_BLOCK_BITS = 1 << 20
+
+# Per field width: each byte value as 8 decimal fields, MSB-first and LSB-first.
+_FIELD_TABLES = {}
+
+
+def _decimal_fields(data: bytes, digits: int, reverse: bool = False) -> decimal.Decimal:
+    # data's bits as one decimal field each, first bit in the top field (or
+    # in the bottom one with reverse).
+    if digits not in _FIELD_TABLES:
+        pad = "0" * (digits - 1)
+        msb = ["".join(pad + str(bit) for bit in _BYTE_BITS[b]) for b in range(256)]
+        lsb = ["".join(pad + str(bit) for bit in reversed(_BYTE_BITS[b])) for b in range(256)]
+        _FIELD_TABLES[digits] = (msb, lsb)
+    msb, lsb = _FIELD_TABLES[digits]
+    if reverse:
+        return decimal.Decimal("".join([lsb[b] for b in reversed(data)]) or "0")
+    return decimal.Decimal("".join([msb[b] for b in data]) or "0")
+
+
+def _padded_bytes(bits: PackedBits, start: int, end: int) -> bytes:
+    # Bits [start, end) as bytes, zero-padded to a whole byte at the end.
+    n = end - start
+    pad = -n % 8
+    return (bits[start:end].to_int() << pad).to_bytes((n + pad) >> 3, "big")
+
+
+def cross_correlation(a: bytes, b: bytes, maxlag: int, np=None) -> List[int]:
+    # sum_i a_i * b_(i + k) for k = 0..maxlag, over the bits of a and b.
+    na = len(a) * 8
+    nb = len(b) * 8
+    if np is not None:
+        size = 1 << (na + nb).bit_length()
+        fa = np.fft.rfft(np.unpackbits(np.frombuffer(a, dtype=np.uint8)).astype(np.float64), size)
+        fb = np.fft.rfft(np.unpackbits(np.frombuffer(b, dtype=np.uint8)).astype(np.float64), size)
+        r = np.fft.irfft(np.conj(fa) * fb, size)[:min(maxlag + 1, nb)]
+        out = np.rint(r).astype(np.int64).tolist()
+    else:
+        # Field k of a reversed times b forward holds lag nb - 1 - k.
+        digits = len(str(na))
+        ctx = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+        prod = str(ctx.multiply(_decimal_fields(a, digits, reverse=True), _decimal_fields(b, digits)))
+        prod = prod.zfill(digits * (na + nb - 1))[digits * (na - 1):digits * (na + maxlag)]
+        out = [int(prod[i:i + digits]) for i in range(0, len(prod), digits)]
+    return out + [0] * (maxlag + 1 - len(out))
+
+
+def autocorrelation(bits: PackedBits, start: int, end: int, maxlag: int, np=None) -> List[int]:
+    # c11 of [start, end) for lags 0..maxlag (lag 0 is the ones count).
+    maxlag = min(maxlag, end - start - 1)
+    block = max(maxlag, _AUTOCORR_BLOCK_BITS)
+    counts = [0] * (maxlag + 1)
+    for s in range(start, end, block):
+        e = min(end, s + block)
+        r = cross_correlation(_padded_bytes(bits, s, e), _padded_bytes(bits, s, min(end, e + maxlag)),
+                              maxlag, np)
+        counts = list(map(add, counts, r))
+    return counts
+
+
+def strongest_lags(bits: PackedBits, start: int, end: int, counts: List[int],
+                   top: int) -> List[Tuple[int, float, float, float]]:
+    # (lag, correlation, z-score, MI) for the top lags >= 1 of counts (from
+    # autocorrelation). Lags are ranked by how far c11 strays from what the
+    # window's overall p1 predicts, in standard errors; the winners are then
+    # scored exactly from their own pair table.
+    n = end - start
+    ones = counts[0]
+    pp = (ones / n) ** 2
+    lags = heapq.nlargest(top, range(1, len(counts)),
+                          key=lambda k: abs(counts[k] - (n - k) * pp) / math.sqrt(n - k))
+    out = []
+    for k in lags:
+        m = n - k
+        c11 = counts[k]
+        ones_a = ones - bits.popcount(end - k, end)
+        ones_b = ones - bits.popcount(start, start + k)
+        c10 = ones_a - c11
+        c01 = ones_b - c11
+        pa = ones_a / m
+        pb = ones_b / m
+        var = pa * (1.0 - pa) * pb * (1.0 - pb)
+        rho = (c11 / m - pa * pb) / math.sqrt(var) if var > 0.0 else math.nan
+        out.append((k, rho, rho * math.sqrt(m), mi_from_counts(m - c11 - c10 - c01, c01, c10, c11)))
+    return out
+
+
+# --- Periodicity -----------------------------------------------------------
+#
+# Dominant bit and byte periods from lag z-scores (the c11 of autocorrelation
+# against what p1 predicts, in standard errors), and phase folds that show
+# how predictable each position of a period is. Peaks are scored by how far
+# they rise above both neighbouring lags, not by their z-score alone: a
+# true period is sharp at the bit level, while the smooth (and, for
+# dependent bits, overdispersed) z-scores of a sticky source are not. Of the
+# peaks within 90% of the best, the shortest wins, so multiples of a period
+# lose to the period.
+
+def lag_zscores(counts: List[int], pairs: List[int], ones: int, n: int) -> List[float]:
+    # z-score per lag (index = lag) of counts, where pairs[k] is the number
+    # of bit pairs behind counts[k] and ones / n is the overall p1. Lag 0
+    # and lags without pairs score -inf; a constant span scores nan.
+    p = ones / n
+    sd = p * (1.0 - p)
+    if sd == 0.0:
+        return [math.nan] * len(counts)
+    pp = p * p
+    return [-math.inf] + [(c - m * pp) / (sd * math.sqrt(m)) if m else -math.inf
+                          for c, m in zip(counts[1:], pairs[1:])]
+
+
+def dominant_period(z: List[float], unit: int = 1, min_z: float = 8.0) -> Optional[int]:
+    # Shortest lag, in multiples of unit bits, whose rise above its
+    # neighbouring lags is at least 90% of the largest rise and at least
+    # min_z; None if there is none.
+    rise = {}
+    for k in range(max(2, unit), len(z) - 1, unit):
+        r = z[k] - max(z[k - 1], z[k + 1])
+        if r > 0.0:
+            rise[k] = r
+    best = max(rise.values(), default=0.0)
+    if best < min_z:
+        return None
+    return next(k for k, r in rise.items() if r >= 0.9 * best) // unit
+
+
+def fold_bytes(data: bytes, period: int, offset: int = 0) -> List[Counter]:
+    # Byte histogram per phase of period, phase counted from byte 0 of the
+    # file when data starts at byte offset.
+    return [Counter(data[(phase - offset) % period::period]) for phase in range(period)]
+
+
+def _hist_entropy(counts) -> float:
+    total = sum(counts)
+    h = 0.0
+    for c in counts:
+        if c:
+            p = c / total
+            h -= p * math.log2(p)
+    return h
+
+
+def phase_entropies(folds: List[Counter], bit_period: Optional[int] = None) -> List[Tuple[int, float]]:
+    # (count, entropy) per phase of a byte fold: byte entropy per byte
+    # phase, or with bit_period (whose lcm with 8 must be 8 * len(folds))
+    # binary entropy per bit phase.
+    if bit_period is None:
+        return [(sum(f.values()), _hist_entropy(f.values())) for f in folds]
+    ones = [0] * bit_period
+    total = [0] * bit_period
+    for phase, f in enumerate(folds):
+        n = sum(f.values())
+        for j in range(8):
+            t = (8 * phase + j) % bit_period
+            ones[t] += sum(c for v, c in f.items() if _BYTE_BITS[v][j])
+            total[t] += n
+    return [(n, entropy_from_counts(k, n)[0] if n else 0.0) for k, n in zip(ones, total)]
+
+
+def period_bytes(bit_period: int) -> int:
+    # Byte fold period that covers a bit period (lcm(bit_period, 8) / 8).
+    return bit_period // math.gcd(bit_period, 8)
+
+
+# --- Changepoint segmentation ----------------------------------------------
+#
+# Splits a stream into variable-length segments at changes in bit density or
+# in lag-1 pair statistics, by binary segmentation on a segment cost: the
+# negative log-likelihood of the bits as Bernoulli trials plus that of their
+# transitions as an order-1 Markov chain. Neither term alone is enough (a
+# run of zeros then a run of ones is one sticky Markov chain; 0xAA and
+# random bits have the same density).
+# Every count comes from prefix sums: candidate splits are scanned on a
+# grid of block edges, where PopcountIndex and PairCountIndex keep their
+# cumulative arrays, and the best one is then moved to the exact bit by a
+# scan of the bits around it. A split is kept if it lowers the cost by more
+# than the penalty (default BIC-like: 4 ln n, for the density, two
+# transition probabilities and the location). Each level of splitting costs one pass
+# over the grid, so the total is near-linear in the input.
+
+def _xlogx(x: int) -> float:
+    return x * math.log(x) if x > 0 else 0.0
+
+
+class Segmenter:
+    # Point records are (ones before i, lag-1 pairs (j, j + 1) of ones with
+    # j < i, bit i - 1, bit i), with 0 for bits outside the stream.
+
+    def __init__(self, bits: PackedBits, penalty: Optional[float] = None,
+                 grid_bits: int = 256, min_bits: int = 128):
+        if grid_bits <= 0 or grid_bits % 8:
+            raise ValueError("grid_bits must be a positive multiple of 8")
+        self.bits = bits
+        self.n = len(bits)
+        self.penalty = 4.0 * math.log(max(self.n, 2)) if penalty is None else penalty
+        self.grid = grid_bits
+        self.min_bits = max(2, min_bits)
+        self.ones = PopcountIndex(bits, grid_bits)
+        self.pairs = PairCountIndex(bits, 1, grid_bits)
+
+    def _bit(self, i: int) -> int:
+        return self.bits[i] if 0 <= i < self.n else 0
+
+    def point(self, i: int) -> Tuple[int, int, int, int]:
+        pairs = self.pairs.prefix(1, i) if i < self.n else self.pairs.prefix(1, self.n - 1)
+        return self.ones.prefix(i), pairs, self._bit(i - 1), self._bit(i)
+
+    def cost(self, pa: tuple, pb: tuple, n: int) -> float:
+        # Negative log-likelihood (nats) of the n bits between two points
+        # under their own density plus that of their transitions under their
+        # own order-1 Markov chain.
+        ones = pb[0] - pa[0]
+        c11 = pb[1] - pa[1] - (pb[2] & pb[3])
+        from1 = ones - pb[2]
+        to1 = ones - pa[3]
+        c10 = from1 - c11
+        c01 = to1 - c11
+        c00 = n - 1 - c11 - c10 - c01
+        return (_xlogx(n) - _xlogx(ones) - _xlogx(n - ones)
+                + _xlogx(from1) + _xlogx(n - 1 - from1)
+                - _xlogx(c00) - _xlogx(c01) - _xlogx(c10) - _xlogx(c11))
+
+    def _best_split(self, a: int, b: int, pa: tuple, pb: tuple) -> Optional[Tuple[int, tuple, float]]:
+        # (position, point, cost) of the cheapest split of [a, b) into two
+        # segments of at least min_bits, or None if there is no room.
+        lo = a + self.min_bits
+        hi = b - self.min_bits
+        if lo > hi:
+            return None
+        g = self.grid
+        gmax = self.n // g
+        ones = self.ones._cum
+        pairs = self.pairs._cum[1]
+        best = None
+        for k in range(-(-lo // g), min(hi // g, gmax) + 1):
+            i = k * g
+            p = (ones[k], pairs[k], self._bit(i - 1), self._bit(i))
+            c = self.cost(pa, p, i - a) + self.cost(p, pb, b - i)
+            if best is None or c < best[2]:
+                best = (i, p, c)
+        # Refine to the bit: scan [centre - g, centre + g] (or the whole
+        # range if it had no grid point) from one exact point.
+        if best is None:
+            start, stop = lo, hi
+        else:
+            start, stop = max(lo, best[0] - g), min(hi, best[0] + g)
+        o, pr, _, cur = self.point(start)
+        local = self.bits[start:min(self.n, stop + 1)].tolist() + [0]
+        prev = self._bit(start - 1)
+        for j in range(stop - start + 1):
+            i = start + j
+            p = (o, pr, prev, cur)
+            c = self.cost(pa, p, i - a) + self.cost(p, pb, b - i)
+            if best is None or c < best[2]:
+                best = (i, p, c)
+            nxt = local[j + 1]
+            o += cur
+            pr += cur & nxt
+            prev, cur = cur, nxt
+        return best
+
+    def segments(self) -> List[int]:
+        # Sorted change points, including 0 and n.
+        if self.n == 0:
+            return [0]
+        self.ones._extend(self.n // self.grid)
+        self.pairs._extend(self.n // self.grid)
+        cuts = [0, self.n]
+        todo = [(0, self.n, self.point(0), self.point(self.n))]
+        while todo:
+            a, b, pa, pb = todo.pop()
+            split = self._best_split(a, b, pa, pb)
+            if split is None:
+                continue
+            i, p, c = split
+            if self.cost(pa, pb, b - a) - c > self.penalty:
+                cuts.append(i)
+                todo += [(a, i, pa, p), (i, b, p, pb)]
+        return sorted(cuts)
+
+
+def compress_ratio_bytes(payload: Union[bytes, memoryview, PackedBits], level: int = 9) -> float:
+    # Byte-aligned PackedBits windows go to zlib as a slice of the source
+    # buffer; other offsets are repacked with one big-int shift.
+    if isinstance(payload, PackedBits):
+        payload = payload.view()
+    n = len(payload) if not isinstance(payload, memoryview) else payload.nbytes
+    if not n:
         return 1.0
     comp = zlib.compress(payload, level)
-    return len(comp) / len(payload)
+    return len(comp) / n
 
 
-def windows(bits: List[int], win: int, step: int):
+def windows(bits: BitSeq, win: int, step: int):
     n = len(bits)
     if win <= 0 or step <= 0:
         return
@@ -121,78 +1302,2437 @@ def windows(bits: List[int], win: int, step: int):
         yield start, bits[start:start + win]
 
 
-def parse_args():
-    ap = argparse.ArgumentParser(
-        description="Detect 'Maxwell Monster' style structure in binary datasets via entropy/MI/compressibility scans."
-    )
-    src = ap.add_mutually_exclusive_group(required=True)
-    src.add_argument("--file", help="Path to a binary file (bytes will be expanded to bits, MSB-first).")
-    src.add_argument("--bits", help="Bitstring like 010011... (whitespace allowed).")
-    ap.add_argument("--window", type=int, default=8192, help="Window size in bits (default: 8192).")
-    ap.add_argument("--step", type=int, default=2048, help="Step size in bits (default: 2048).")
-    ap.add_argument("--maxlag", type=int, default=8, help="Compute MI for lags 1..maxlag (default: 8).")
-    ap.add_argument("--z", type=float, default=3.0, help="Flag if entropy z-score <= -z (default: 3.0).")
-    ap.add_argument("--cratio", type=float, default=0.98,
-                    help="Also flag if compression_ratio <= cratio (default: 0.98). Lower means more compressible.")
-    ap.add_argument("--csv", default="-", help="Output CSV path, or '-' for stdout (default).")
-    return ap.parse_args()
+def stream_windows(f, win: int, step: int, chunk_size: int = 1 << 20):
+    # Like windows(), but pulls bytes from a binary file object in chunks and
+    # only keeps the bytes the current window still needs.
+    if win <= 0 or step <= 0:
+        return
+    read = getattr(f, "read1", f.read)
+    buf = b""
+    base = 0  # bit index of buf[0]
+    start = 0
+    while True:
+        while len(buf) * 8 < start + win - base:
+            chunk = read(chunk_size)
+            if not chunk:
+                return
+            drop = min(len(buf), (start - base) >> 3)
+            buf = buf[drop:] + chunk
+            base += drop * 8
+        yield start, PackedBits(buf, start - base, win)
+        start += step
 
 
-def load_bits_from_args(args) -> List[int]:
-    if args.file:
-        with open(args.file, "rb") as f:
-            data = f.read()
-        return bytes_to_bits(data)
+class FollowReader:
+    # File wrapper for --follow: read() waits for the file to grow instead of
+    # returning b"" at EOF, polling every `poll` seconds like tail -f. It
+    # gives up if the file shrinks (truncated or replaced by a shorter one).
 
-    s = "".join(ch for ch in args.bits if ch in "01")
-    return [1 if ch == "1" else 0 for ch in s]
+    def __init__(self, f, poll: float = 0.01):
+        self.f = f
+        self.poll = poll
+        self.pos = 0
 
+    def read(self, n: int) -> bytes:
+        while True:
+            chunk = self.f.read(n)
+            if chunk:
+                self.pos += len(chunk)
+                return chunk
+            if os.fstat(self.f.fileno()).st_size < self.pos:
+                raise SystemExit(f"{self.f.name}: file truncated")
+            time.sleep(self.poll)
 
-def main():
-    args = parse_args()
-    bits = load_bits_from_args(args)
 
-    if len(bits) < args.window:
-        raise SystemExit(f"Need at least {args.window} bits, got {len(bits)}.")
+class RollingStats:
+    # Mean/stdev of the last `size` values, exact like RunningStats.final()
+    # (no drift from repeated add/remove), in memory bounded by `size`.
 
-    # First pass: gather metrics per window
-    rows = []
-    entropies = []
-    for start, wbits in windows(bits, args.window, args.step):
-        h, p1 = binary_shannon_entropy(wbits)
-        entropies.append(h)
+    def __init__(self, size: int):
+        self.size = size
+        self.values = deque()
+        self.stats = RunningStats()
 
-        mi = [mutual_information_lag(wbits, k) for k in range(1, args.maxlag + 1)]
-        payload = bits_to_bytes(wbits)
-        cr = compress_ratio_bytes(payload)
+    def add(self, x: float) -> None:
+        self.values.append(x)
+        self.stats.add(x)
+        if len(self.values) > self.size:
+            self.stats.remove(self.values.popleft())
 
-        rows.append((start, start + args.window, h, p1, mi, cr))
+    def final(self) -> Tuple[float, float]:
+        return self.stats.final()
 
-    mu = statistics.mean(entropies)
-    sd = statistics.pstdev(entropies)  # population stddev for stability
-    if sd == 0.0:
-        sd = 1e-12
 
-    # Output
-    out_f = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
-    try:
-        w = csv.writer(out_f)
-        header = ["start_bit", "end_bit", "entropy_bits_per_bit", "p1", "entropy_zscore"]
-        header += [f"mi_lag{k}" for k in range(1, args.maxlag + 1)]
-        header += ["compression_ratio", "flagged"]
-        w.writerow(header)
+class RunningStats:
+    # Constant-memory statistics of a stream of floats (window entropies).
+    # Welford's update gives provisional mean/stdev while streaming. Exact
+    # sums of x and x*x, kept as ints scaled by 2**1074 / 2**2148, give a
+    # final mean and population stdev equal to statistics.mean/pstdev (which
+    # are exact and correctly rounded), and can be subtracted.
 
-        for (start, end, h, p1, mi, cr) in rows:
-            zscore = (h - mu) / sd
-            flagged = (zscore <= -abs(args.z)) or (cr <= args.cratio)
-            w.writerow([start, end, f"{h:.6f}", f"{p1:.6f}", f"{zscore:.3f}"]
-                       + [f"{x:.6f}" for x in mi]
-                       + [f"{cr:.6f}", int(flagged)])
-    finally:
-        if out_f is not sys.stdout:
-            out_f.close()
+    _SCALE = 1074  # every finite float is an integer multiple of 2**-1074
 
+    def __init__(self):
+        self.n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._sx = 0
+        self._sxx = 0
 
-if __name__ == "__main__":
-    main()
+    def _scaled(self, x: float) -> Tuple[int, int]:
+        num, den = x.as_integer_ratio()
+        shift = self._SCALE - (den.bit_length() - 1)
+        return num << shift, (num * num) << (2 * shift)
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        delta = x - self._mean
+        self._mean += delta / self.n
+        self._m2 += delta * (x - self._mean)
+        sx, sxx = self._scaled(x)
+        self._sx += sx
+        self._sxx += sxx
+
+    def remove(self, x: float) -> None:
+        if self.n <= 1:
+            self.__init__()
+            return
+        delta = x - self._mean
+        self.n -= 1
+        self._mean -= delta / self.n
+        self._m2 = max(0.0, self._m2 - delta * (x - self._mean))
+        sx, sxx = self._scaled(x)
+        self._sx -= sx
+        self._sxx -= sxx
+
+    def sums(self) -> Tuple[int, int, int]:
+        return self.n, self._sx, self._sxx
+
+    @classmethod
+    def from_sums(cls, n: int, sx: int, sxx: int) -> "RunningStats":
+        # Exact state from sums(); the Welford fields are rebuilt from it.
+        st = cls()
+        st.n, st._sx, st._sxx = n, sx, sxx
+        if n:
+            st._mean = st.mean()
+            st._m2 = st.pstdev() ** 2 * n
+        return st
+
+    def provisional(self) -> Tuple[float, float]:
+        if self.n == 0:
+            return 0.0, 1e-12
+        sd = math.sqrt(self._m2 / self.n)
+        return self._mean, sd if sd > 0.0 else 1e-12
+
+    def mean(self) -> float:
+        return self._sx / (self.n << self._SCALE)
+
+    def pstdev(self) -> float:
+        num = self.n * self._sxx - self._sx * self._sx
+        return _float_sqrt_of_frac(num, (self.n * self.n) << (2 * self._SCALE))
+
+    def final(self) -> Tuple[float, float]:
+        sd = self.pstdev()
+        return self.mean(), sd if sd > 0.0 else 1e-12
+
+
+def _float_sqrt_of_frac(n: int, m: int) -> float:
+    # Correctly rounded sqrt(n / m), the same method statistics.pstdev uses.
+    if n <= 0:
+        return 0.0
+    q = (n.bit_length() - m.bit_length() - 109) // 2
+    if q >= 0:
+        num = _isqrt_frac_rto(n, m << 2 * q) << q
+        den = 1
+    else:
+        num = _isqrt_frac_rto(n << -2 * q, m)
+        den = 1 << -q
+    return num / den
+
+
+def _isqrt_frac_rto(n: int, m: int) -> int:
+    a = math.isqrt(n // m)
+    return a | (a * a * m != n)
+
+
+# --- Metric backends -------------------------------------------------------
+#
+# A backend yields (start, entropy, p1, [mi_lag1..mi_lagN]) for every window of
+# a PackedBits stream. Backends only differ in how they obtain the integer
+# counts; the floats always come from entropy_from_counts/mi_from_counts so
+# every backend produces the same CSV.
 
+BACKENDS = ("auto", "python", "numpy")
+
+WindowMetrics = Tuple[int, float, float, List[float]]
+
+
+class PythonBackend:
+    name = "python"
+
+    def window_metrics(self, bits: PackedBits, win: int, step: int, maxlag: int,
+                       index: Optional[PopcountIndex] = None,
+                       pairs: Optional[PairCountIndex] = None) -> Iterator[WindowMetrics]:
+        # index/pairs may be shared between scans of the same bits (one per
+        # scale of --windows); with a PairCountIndex, MI needs no sliding state.
+        if index is None:
+            index = PopcountIndex(bits)
+        if pairs is not None:
+            for start, _ in windows(bits, win, step):
+                h, p1 = index.entropy(start, start + win)
+                yield start, h, p1, pairs.mutual_information(index, start, win, maxlag)
+            return
+        sliding = SlidingPairCounts(bits, win, maxlag, index)
+        for start, _ in windows(bits, win, step):
+            h, p1 = index.entropy(start, start + win)
+            sliding.move_to(start)
+            yield start, h, p1, sliding.mutual_information()
+
+
+class NumpyBackend:
+    # Unpacks a span of windows at once and takes every window's ones-count
+    # and per-lag c11 from segment sums between window boundaries
+    # (np.add.reduceat, then a cumulative sum over the segments), so counting
+    # is one array pass per lag per chunk. Spans are capped at chunk_bits to
+    # bound memory. The float maths is batched too, but with the same
+    # operation order as the scalar functions and math.log2 for the
+    # logarithms, so results are bit-identical.
+    name = "numpy"
+
+    def __init__(self, np, chunk_bits: int = 1 << 22):
+        self.np = np
+        self.chunk_bits = chunk_bits
+
+    def _log2(self, x):
+        np = self.np
+        return np.fromiter(map(math.log2, x.tolist()), dtype=np.float64, count=len(x))
+
+    def _entropy(self, ones, n: int):
+        np = self.np
+        p1 = ones / n
+        p0 = 1.0 - p1
+        h = np.zeros(len(ones))
+        for p in (p0, p1):
+            ok = p > 0.0
+            if ok.any():
+                t = np.zeros(len(ones))
+                t[ok] = p[ok] * self._log2(p[ok])
+                h -= t
+        return h, p1
+
+    def _mi(self, c00, c01, c10, c11, m: int):
+        np = self.np
+        mi = np.zeros(len(c00))
+        pa0 = (c00 + c01) / m
+        pa1 = (c10 + c11) / m
+        pb0 = (c00 + c10) / m
+        pb1 = (c01 + c11) / m
+        for cxy, px, py in ((c00, pa0, pb0), (c01, pa0, pb1), (c10, pa1, pb0), (c11, pa1, pb1)):
+            pxy = cxy / m
+            ok = (pxy > 0.0) & (px > 0.0) & (py > 0.0)
+            t = np.zeros(len(c00))
+            if ok.any():
+                q = pxy[ok]
+                t[ok] = q * self._log2(q / (px[ok] * py[ok]))
+            mi += t
+        return mi
+
+    def window_metrics(self, bits: PackedBits, win: int, step: int, maxlag: int,
+                       index=None, pairs=None) -> Iterator[WindowMetrics]:
+        # index/pairs are accepted for interface parity and ignored.
+        np = self.np
+        n = len(bits)
+        if win <= 0 or step <= 0 or n < win:
+            return
+        total = (n - win) // step + 1
+        per_chunk = max(1, (self.chunk_bits - win) // step + 1)
+        top = min(maxlag, win - 1)
+        for first in range(0, total, per_chunk):
+            count = min(per_chunk, total - first)
+            s0 = first * step
+            span = (count - 1) * step + win
+            g = bits.offset + s0
+            lo = g >> 3
+            raw = np.frombuffer(bits.buffer[lo:(g + span + 7) >> 3], dtype=np.uint8)
+            u = np.unpackbits(raw)[g - (lo << 3):g - (lo << 3) + span]
+            rel = np.arange(count, dtype=np.int64) * step
+            ends = rel + win
+            bounds = np.unique(np.concatenate((rel, ends)))
+            i_start = np.searchsorted(bounds, rel)
+            i_end = np.searchsorted(bounds, ends)
+
+            seg_dtype = np.int32 if span < (1 << 31) else np.int64
+
+            def window_sums(arr):
+                seg = np.add.reduceat(arr, bounds[:-1], dtype=seg_dtype)
+                pref = np.zeros(len(bounds), dtype=np.int64)
+                np.cumsum(seg, out=pref[1:])
+                return pref[i_end] - pref[i_start]
+
+            ones = window_sums(u)
+            h, p1 = self._entropy(ones, win)
+            heads = ones.copy()
+            tails = ones.copy()
+            prod = np.zeros(span, dtype=np.uint8)
+            cols = []
+            for k in range(1, top + 1):
+                heads -= u[ends - k]
+                tails -= u[rel + k - 1]
+                np.bitwise_and(u[:-k], u[k:], out=prod[:-k])
+                prod[span - k:] = 0
+                c11 = window_sums(prod)
+                for j in range(1, k + 1):
+                    c11 -= prod[ends - j]
+                c10 = heads - c11
+                c01 = tails - c11
+                c00 = (win - k) - c11 - c10 - c01
+                cols.append(self._mi(c00, c01, c10, c11, win - k).tolist())
+            pad = [0.0] * (maxlag - top)
+            h = h.tolist()
+            p1 = p1.tolist()
+            for j in range(count):
+                yield s0 + j * step, h[j], p1[j], [c[j] for c in cols] + pad
+
+
+def get_backend(name: str = "auto"):
+    if name not in BACKENDS:
+        raise ValueError(f"unknown backend {name!r} (expected one of {', '.join(BACKENDS)})")
+    if name in ("auto", "numpy"):
+        try:
+            import numpy
+        except ImportError:
+            if name == "numpy":
+                raise
+        else:
+            return NumpyBackend(numpy)
+    return PythonBackend()
+
+
+Row = Tuple[int, int, float, float, List[float], float]
+
+
+def scan_windows(bits: PackedBits, win: int, step: int, maxlag: int,
+                 backend, zlib_threads: int = 0, **shared) -> Iterator[Row]:
+    # (start, end, entropy, p1, [mi_lag1..mi_lagN], compression_ratio) per window.
+    # With zlib_threads > 0 the compression runs in a thread pool: zlib
+    # releases the GIL while deflating, so it overlaps with the backend's
+    # Python-side counting. At most a few windows per thread are in flight
+    # and rows still come out in window order.
+    metrics = backend.window_metrics(bits, win, step, maxlag, **shared)
+    if zlib_threads <= 0:
+        for start, h, p1, mi in metrics:
+            yield start, start + win, h, p1, mi, compress_ratio_bytes(bits[start:start + win])
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    limit = 4 * zlib_threads
+    pending = deque()
+    with ThreadPoolExecutor(zlib_threads) as pool:
+        for start, h, p1, mi in metrics:
+            pending.append((start, h, p1, mi, pool.submit(compress_ratio_bytes, bits[start:start + win])))
+            if len(pending) > limit:
+                start, h, p1, mi, cr = pending.popleft()
+                yield start, start + win, h, p1, mi, cr.result()
+        while pending:
+            start, h, p1, mi, cr = pending.popleft()
+            yield start, start + win, h, p1, mi, cr.result()
+
+
+# --- Parallel scanning -----------------------------------------------------
+#
+# Windows are split into contiguous shards of whole windows, so shard starts
+# stay aligned to the step and neighbouring shards overlap by win - step bits.
+# Workers never receive the data: they map the input file themselves, or
+# attach to a multiprocessing.shared_memory copy when the bits came from
+# --bits, stdin or --no-mmap. Only shard bounds go out and rows come back,
+# in shard order, so the CSV is identical to a serial run.
+
+_worker = {}  # per-process state set up by _init_worker
+
+
+def shard_ranges(nbits: int, win: int, step: int, nshards: int) -> List[Tuple[int, int]]:
+    # (first_window, window_count) pairs covering every window in order.
+    if win <= 0 or step <= 0 or nbits < win:
+        return []
+    total = (nbits - win) // step + 1
+    nshards = max(1, min(nshards, total))
+    size, extra = divmod(total, nshards)
+    out = []
+    first = 0
+    for i in range(nshards):
+        count = size + (i < extra)
+        out.append((first, count))
+        first += count
+    return out
+
+
+def _init_worker(source: tuple, nbits: int, backend_name: str,
+                 win: int, step: int, maxlag: int, zlib_threads: int = 0) -> None:
+    kind, ref = source
+    if kind == "file":
+        with open(ref, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        from multiprocessing import shared_memory
+        buf = shared_memory.SharedMemory(name=ref)
+        _worker["shm"] = buf  # keep the segment attached
+        buf = buf.buf
+    _worker["bits"] = PackedBits(buf, 0, nbits)
+    _worker["backend"] = get_backend(backend_name)
+    _worker["params"] = (win, step, maxlag, zlib_threads)
+
+
+def _scan_shard(shard: Tuple[int, int]) -> List[Row]:
+    first, count = shard
+    win, step, maxlag, zlib_threads = _worker["params"]
+    s0 = first * step
+    sub = _worker["bits"][s0:s0 + (count - 1) * step + win]
+    return [(s0 + start, s0 + end, h, p1, mi, cr)
+            for start, end, h, p1, mi, cr in scan_windows(sub, win, step, maxlag,
+                                                           _worker["backend"], zlib_threads)]
+
+
+def scan_parallel(bits: PackedBits, win: int, step: int, maxlag: int, backend_name: str,
+                  jobs: int, path: Optional[str] = None, zlib_threads: int = 0) -> Iterator[Row]:
+    # path, if given, is a regular file whose contents are exactly bits.
+    import multiprocessing
+
+    shards = shard_ranges(len(bits), win, step, jobs * 4)
+    shm = None
+    if path is not None:
+        source = ("file", path)
+    else:
+        from multiprocessing import shared_memory
+        if bits.offset & 7:
+            data = bits.tobytes()
+        else:
+            data = bits.buffer[bits.offset >> 3:(bits.offset + len(bits) + 7) >> 3]
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        shm.buf[:len(data)] = data
+        source = ("shm", shm.name)
+    try:
+        with multiprocessing.Pool(jobs, _init_worker,
+                                  (source, len(bits), backend_name, win, step, maxlag,
+                                   zlib_threads)) as pool:
+            for rows in pool.imap(_scan_shard, shards):
+                yield from rows
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+
+# --- Health tests ----------------------------------------------------------
+#
+# Continuous health tests from NIST SP 800-90B section 4.4, run incrementally
+# over a byte stream whose samples are either bytes or single bits (MSB
+# first). Both tests work a chunk at a time with bytes/int operations
+# (regex over an XOR image for the Repetition Count Test, bytes.count or a
+# popcount per window for the Adaptive Proportion Test), not per sample.
+
+_NONZERO_BYTES = re.compile(b"[^\x00]+")
+
+
+def rct_cutoff(h: float, alpha: float) -> int:
+    # C = 1 + ceil(-log2(alpha) / H)
+    return 1 + math.ceil(-math.log2(alpha) / h)
+
+
+def apt_cutoff(h: float, alpha: float, window: int) -> int:
+    # C = 1 + CRITBINOM(W, 2**-H, 1 - alpha): one more than the smallest k
+    # with P(X > k) <= alpha for X ~ Binomial(W, 2**-H).
+    p = 2.0 ** -h
+    if p >= 1.0:
+        return window + 1
+    lp = math.log(p)
+    lq = math.log1p(-p)
+    lw = math.lgamma(window + 1)
+    tail = 0.0
+    for j in range(window, -1, -1):
+        if tail > alpha:
+            return j + 2
+        tail += math.exp(lw - math.lgamma(j + 1) - math.lgamma(window - j + 1) + j * lp + (window - j) * lq)
+    return 1
+
+
+class RepetitionCountTest:
+    # Alarms on any run of `cutoff` identical samples. Each run is reported
+    # once, at the sample that completes it, even if it spans chunks.
+
+    def __init__(self, cutoff: int, bits: bool = False):
+        if cutoff < 2:
+            raise ValueError("RCT cutoff must be at least 2")
+        self.cutoff = cutoff
+        self.bits = bits
+        self.n = 0  # samples seen
+        self._tail = b""  # last bytes of the stream, enough to hold cutoff - 1 samples
+        self._keep = -(-(cutoff - 1) // 8) if bits else cutoff - 1
+        self._run_end = -1  # last sample of the most recently reported run
+        if not bits:
+            self._pattern = re.compile(b"\x00{%d,}" % max(1, cutoff - 1))
+
+    def feed(self, data: bytes) -> List[int]:
+        # Sample indexes at which a new failing run completes.
+        if not data:
+            return []
+        buf = self._tail + data
+        first = self.n - (len(self._tail) * 8 if self.bits else len(self._tail))
+        self.n += len(data) * 8 if self.bits else len(data)
+        self._tail = buf[-self._keep:] if self._keep else b""
+        runs = self._bit_runs(buf) if self.bits else self._byte_runs(buf)
+        alarms = []
+        for start, end in runs:
+            start += first
+            end += first
+            if start <= self._run_end:
+                self._run_end = max(self._run_end, end)
+                continue
+            self._run_end = end
+            alarms.append(start + self.cutoff - 1)
+        return alarms
+
+    def _byte_runs(self, buf: bytes) -> Iterator[Tuple[int, int]]:
+        # XOR each byte with its predecessor; cutoff - 1 zero bytes in a row
+        # mark cutoff equal samples. Yields (first, last) sample of each run.
+        n = len(buf)
+        x = int.from_bytes(buf, "big")
+        d = ((x ^ (x >> 8)) | (0xFF << (8 * (n - 1)))).to_bytes(n, "big")
+        for m in self._pattern.finditer(d):
+            yield m.start() - 1, m.end() - 1
+
+    def _bit_runs(self, buf: bytes) -> Iterator[Tuple[int, int]]:
+        # Same idea on bits: d has a 0 wherever a bit equals its predecessor;
+        # OR-smearing d over cutoff - 1 positions leaves a 0 only where a
+        # failing run ends. Positions count down from the first bit at L - 1.
+        L = len(buf) * 8
+        x = int.from_bytes(buf, "big")
+        d = (x ^ (x >> 1)) | (1 << (L - 1))
+        o = d
+        span = 1
+        while span < self.cutoff - 1:
+            t = min(span, self.cutoff - 1 - span)
+            o |= o >> t
+            span += t
+        ends = ~o & ((1 << L) - 1)
+        if not ends:
+            return
+        ends = ends.to_bytes(L >> 3, "big")
+        # Walk only the non-zero bytes; a stretch of run ends never spans a
+        # zero byte, so each region is handled as its own small int.
+        for m in _NONZERO_BYTES.finditer(ends):
+            base = m.start() * 8
+            n = (m.end() - m.start()) * 8
+            e = int.from_bytes(m.group(), "big")
+            while e:
+                top = e.bit_length() - 1
+                low = (~e & ((1 << top) - 1)).bit_length()  # lowest position of this stretch
+                yield base + n - 1 - top - (self.cutoff - 1), base + n - 1 - low
+                e &= (1 << low) - 1
+
+
+class AdaptiveProportionTest:
+    # Disjoint windows of `window` samples; alarms when the first sample of a
+    # window occurs `cutoff` or more times in it.
+
+    def __init__(self, cutoff: int, window: int, bits: bool = False):
+        if bits and window % 8:
+            raise ValueError("bit-sample APT windows must be a multiple of 8 bits")
+        self.cutoff = cutoff
+        self.window = window
+        self.bits = bits
+        self.n = 0  # samples in completed windows
+        self._pending = b""
+
+    def feed(self, data: bytes) -> List[Tuple[int, int]]:
+        # (first sample of the window, count) for every failing window.
+        buf = self._pending + data
+        size = self.window // 8 if self.bits else self.window
+        full = len(buf) - len(buf) % size
+        alarms = []
+        for j in range(0, full, size):
+            w = buf[j:j + size]
+            if self.bits:
+                ones = popcount(int.from_bytes(w, "big"))
+                count = ones if w[0] & 0x80 else self.window - ones
+            else:
+                count = w.count(w[0])
+            if count >= self.cutoff:
+                alarms.append((self.n, count))
+            self.n += self.window
+        self._pending = buf[full:]
+        return alarms
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(
+        description="Detect 'Maxwell Monster' style structure in binary datasets via entropy/MI/compressibility scans."
+    )
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--file", help="Path to a binary file (bytes will be expanded to bits, MSB-first), "
+                                    "or '-' for stdin.")
+    src.add_argument("--bits", help="Bitstring like 010011... (whitespace allowed).")
+    src.add_argument("--batch", metavar="DIR|GLOB",
+                     help="Scan many files in one process pool: every *.bin in DIR, or the files matching "
+                          "GLOB. Each file's CSV is written next to it (or into --outdir) as it finishes.")
+    ap.add_argument("--window", type=int, default=8192, help="Window size in bits (default: 8192).")
+    ap.add_argument("--step", type=int, default=2048, help="Step size in bits (default: 2048).")
+    ap.add_argument("--windows", type=int_list, metavar="W1,W2,...",
+                    help="Scan several window sizes in one pass over shared popcount/pair-count indexes. "
+                         "Output is one table with a leading window_bits column; z-scores are per scale "
+                         "and --step applies to every scale.")
+    ap.add_argument("--maxlag", type=int, default=8, help="Compute MI for lags 1..maxlag (default: 8).")
+    ap.add_argument("--z", type=float, default=3.0, help="Flag if entropy z-score <= -z (default: 3.0).")
+    ap.add_argument("--cratio", type=float, default=0.98,
+                    help="Also flag if compression_ratio <= cratio (default: 0.98). Lower means more compressible.")
+    ap.add_argument("--csv", default="-", help="Output CSV path, or '-' for stdout (default).")
+    ap.add_argument("--outdir", help="Directory for --batch CSVs (default: next to each input).")
+    ap.add_argument("--cache-dir",
+                    help="Reuse per-window metrics cached here for the same input and --window/--step/--maxlag; "
+                         "--z and --cratio are applied on render (default: no cache).")
+    ap.add_argument("--cache-max-mb", type=int, default=1024,
+                    help="Evict least recently used cache entries beyond this size (default: 1024).")
+    ap.add_argument("--backend", choices=BACKENDS, default="auto",
+                    help="Metric backend: numpy if importable, else pure Python (default: auto).")
+    ap.add_argument("--mmap", dest="mmap", action="store_true", default=None,
+                    help="Memory-map --file instead of reading it (default for regular files).")
+    ap.add_argument("--no-mmap", dest="mmap", action="store_false",
+                    help="Read --file into memory even if it could be memory-mapped.")
+    ap.add_argument("--stream", action="store_true",
+                    help="Read --file (or stdin) in chunks and write rows as windows complete, in constant "
+                         "memory. z-scores are provisional (running mean/stdev); a --csv file is rewritten "
+                         "with final z-scores at the end.")
+    ap.add_argument("--chunk-bytes", type=int, default=1 << 20,
+                    help="Read size for --stream and --follow (default: 1048576).")
+    ap.add_argument("--follow", action="store_true",
+                    help="Like tail -f: keep scanning --file as it grows, writing each complete window as it "
+                         "lands, z-scored against a rolling baseline. Stop with Ctrl-C.")
+    ap.add_argument("--baseline", type=int, default=1024,
+                    help="Windows in the rolling z-score baseline for --follow (default: 1024).")
+    ap.add_argument("--poll", type=float, default=0.01,
+                    help="Seconds between size checks while --follow waits for data (default: 0.01).")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="Scan windows in N worker processes (default: 1). Output is identical to a serial run.")
+    ap.add_argument("--zlib-threads", type=int, default=0,
+                    help="Compress windows in a pool of N threads, overlapping zlib with the entropy/MI "
+                         "work (default: 0, compress inline).")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Keep block hashes and window metrics in <file>.mdscan and, on later runs, rescan only "
+                         "windows overlapping changed or appended blocks.")
+    ap.add_argument("--save-metrics", metavar="PATH",
+                    help="Also write the raw per-window metrics to PATH, for the reflag and sweep commands.")
+    ap.add_argument("--nist", action="store_true",
+                    help="Add per-window SP 800-22 p-values (frequency, block frequency, runs, longest run, "
+                         "serial, approximate entropy, cumulative sums).")
+    ap.add_argument("--nist-alpha", type=float, default=0.001,
+                    help="With --nist, also flag windows with any p-value below this (default: 0.001).")
+    ap.add_argument("--linear-complexity", action="store_true",
+                    help="Add each window's linear complexity (shortest generating LFSR, by Berlekamp-Massey). "
+                         "Catches LFSR/PRBS data that passes the other metrics.")
+    ap.add_argument("--lc-margin", type=int, default=16,
+                    help="With --linear-complexity, flag windows whose complexity is more than this below "
+                         "window/2 (default: 16).")
+    return ap.parse_args(argv)
+
+
+def health_main(argv: List[str]) -> None:
+    ap = argparse.ArgumentParser(
+        prog="maxwell_monster_detector.py health",
+        description="Continuous SP 800-90B health tests (Repetition Count and Adaptive Proportion) on a stream."
+    )
+    ap.add_argument("input", nargs="?", default="-", help="File, FIFO or '-' for stdin (default).")
+    ap.add_argument("--samples", choices=("bytes", "bits"), default="bytes",
+                    help="Treat each byte or each bit (MSB first) as one sample (default: bytes).")
+    ap.add_argument("--entropy", type=float,
+                    help="Claimed min-entropy per sample, H (default: 8 for bytes, 1 for bits).")
+    ap.add_argument("--alpha", type=float, default=2.0 ** -20,
+                    help="False-positive probability per test (default: 2**-20).")
+    ap.add_argument("--apt-window", type=int,
+                    help="APT window in samples (default: 1024 for bits, 512 for bytes, per SP 800-90B 4.4.2).")
+    ap.add_argument("--chunk-bytes", type=int, default=1 << 16,
+                    help="Largest read (default: 65536). Smaller reads lower alarm latency.")
+    ap.add_argument("--report", type=float, default=10.0,
+                    help="Seconds between throughput reports on stderr; 0 disables (default: 10).")
+    args = ap.parse_args(argv)
+
+    bits = args.samples == "bits"
+    h = args.entropy if args.entropy is not None else (1.0 if bits else 8.0)
+    if not 0.0 < h <= (1.0 if bits else 8.0):
+        raise SystemExit(f"--entropy must be in (0, {1 if bits else 8}] for {args.samples} samples.")
+    if not 0.0 < args.alpha < 1.0:
+        raise SystemExit("--alpha must be in (0, 1).")
+    window = args.apt_window or (1024 if bits else 512)
+    try:
+        rct = RepetitionCountTest(rct_cutoff(h, args.alpha), bits)
+        apt = AdaptiveProportionTest(apt_cutoff(h, args.alpha, window), window, bits)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    f_in = sys.stdin.buffer if args.input == "-" else open(args.input, "rb", buffering=0)
+    read = getattr(f_in, "read1", f_in.read)
+    w = csv.writer(sys.stdout)
+    w.writerow(["test", "sample", "detail"])
+    sys.stdout.flush()
+    nbytes = alarms = 0
+    t0 = last = time.perf_counter()
+
+    def report(now: float) -> None:
+        secs = max(now - t0, 1e-9)
+        print(f"health: {nbytes} bytes in {secs:.1f}s ({nbytes / secs / 1e6:.1f} MB/s), "
+              f"{alarms} alarms (RCT cutoff {rct.cutoff}, APT cutoff {apt.cutoff}/{apt.window})",
+              file=sys.stderr)
+
+    try:
+        while True:
+            chunk = read(args.chunk_bytes)
+            if not chunk:
+                break
+            nbytes += len(chunk)
+            found = [("rct", i, f"run>={rct.cutoff}") for i in rct.feed(chunk)]
+            found += [("apt", i, f"count={c}") for i, c in apt.feed(chunk)]
+            if found:
+                alarms += len(found)
+                w.writerows(sorted(found, key=lambda a: a[1]))
+                sys.stdout.flush()
+            if args.report > 0:
+                now = time.perf_counter()
+                if now - last >= args.report:
+                    report(now)
+                    last = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if f_in is not sys.stdin.buffer:
+            f_in.close()
+    report(time.perf_counter())
+    if alarms:
+        raise SystemExit(1)
+
+
+def int_list(s: str) -> List[int]:
+    try:
+        return [int(x) for x in s.split(",") if x.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {s!r}")
+
+
+def float_list(s: str) -> List[float]:
+    try:
+        return [float(x) for x in s.split(",") if x.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated numbers, got {s!r}")
+
+
+def open_metrics(path: str):
+    with open(path, "rb") as f:
+        try:
+            return read_metrics(f)
+        except ValueError as e:
+            raise SystemExit(f"{path}: {e}")
+
+
+def reflag_main(argv: List[str]) -> None:
+    # Re-render a CSV from saved metrics with new thresholds; nothing is rescanned.
+    ap = argparse.ArgumentParser(
+        prog="maxwell_monster_detector.py reflag",
+        description="Apply new --z/--cratio thresholds to metrics saved with --save-metrics (or a cache entry)."
+    )
+    ap.add_argument("metrics", help="Metrics file written by --save-metrics.")
+    ap.add_argument("--z", type=float, default=3.0, help="Flag if entropy z-score <= -z (default: 3.0).")
+    ap.add_argument("--cratio", type=float, default=0.98,
+                    help="Also flag if compression_ratio <= cratio (default: 0.98).")
+    ap.add_argument("--csv", default="-", help="Output CSV path, or '-' for stdout (default).")
+    args = ap.parse_args(argv)
+
+    _, _, maxlag, rows = open_metrics(args.metrics)
+    if not rows:
+        raise SystemExit(f"{args.metrics}: no windows")
+    write_csv(args.csv, rows, [r[2] for r in rows], maxlag, args.z, args.cratio)
+
+
+def sweep_counts(entropies: List[float], ratios: List[float], zs: List[float],
+                 cratios: List[float]) -> List[Tuple[float, float, int, int, int]]:
+    # (z, cratio, flagged, entropy_flagged, cratio_flagged) for every pair, with
+    # the same z-score arithmetic and comparisons as format_row. The union is
+    # counted as |A| + |B| - |A & B|; only the entropy-flagged windows are
+    # bisected per cratio, so the grid costs about one pass, not one per pair.
+    mu, sd = entropy_stats(entropies)
+    zscores = [(h - mu) / sd for h in entropies]
+    sorted_ratios = sorted(ratios)
+    by_z = sorted(zip(zscores, ratios))
+    keys = [zs_ for zs_, _ in by_z]
+    out = []
+    for z in zs:
+        n_z = bisect.bisect_right(keys, -abs(z))
+        flagged_ratios = sorted(cr for _, cr in by_z[:n_z])
+        for c in cratios:
+            n_c = bisect.bisect_right(sorted_ratios, c)
+            both = bisect.bisect_right(flagged_ratios, c)
+            out.append((z, c, n_z + n_c - both, n_z, n_c))
+    return out
+
+
+def sweep_main(argv: List[str]) -> None:
+    ap = argparse.ArgumentParser(
+        prog="maxwell_monster_detector.py sweep",
+        description="Count flagged windows for every (z, cratio) pair over saved metrics."
+    )
+    ap.add_argument("metrics", help="Metrics file written by --save-metrics.")
+    ap.add_argument("--z", type=float_list, default=[2.0, 2.5, 3.0, 3.5, 4.0],
+                    help="Comma-separated z-score cutoffs (default: 2,2.5,3,3.5,4).")
+    ap.add_argument("--cratio", type=float_list, default=[0.9, 0.95, 0.98, 1.0],
+                    help="Comma-separated compression-ratio cutoffs (default: 0.9,0.95,0.98,1.0).")
+    ap.add_argument("--csv", default="-", help="Output CSV path, or '-' for stdout (default).")
+    args = ap.parse_args(argv)
+
+    with open(args.metrics, "rb") as f:
+        try:
+            entropies, ratios = read_metric_columns(f)
+        except ValueError as e:
+            raise SystemExit(f"{args.metrics}: {e}")
+    if not entropies:
+        raise SystemExit(f"{args.metrics}: no windows")
+
+    out_f = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
+    try:
+        w = csv.writer(out_f)
+        w.writerow(["z", "cratio", "windows", "flagged", "entropy_flagged", "cratio_flagged"])
+        for z, c, flagged, n_z, n_c in sweep_counts(entropies, ratios, args.z, args.cratio):
+            w.writerow([z, c, len(entropies), flagged, n_z, n_c])
+    finally:
+        if out_f is not sys.stdout:
+            out_f.close()
+
+
+def open_bits(path: str, use_mmap: Optional[bool] = None) -> PackedBits:
+    # With use_mmap=None, regular non-empty files are mapped read-only and
+    # anything else (pipes, devices) is read into memory.
+    if path == "-":
+        return PackedBits(sys.stdin.buffer.read())
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if use_mmap is None:
+            use_mmap = stat.S_ISREG(st.st_mode)
+        if use_mmap and st.st_size > 0:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            return PackedBits(mm)
+        return PackedBits(f.read())
+
+
+def load_bits_from_args(args) -> PackedBits:
+    if args.file:
+        return open_bits(args.file, getattr(args, "mmap", None))
+
+    return PackedBits.from_bitstring(args.bits)
+
+
+def csv_header(maxlag: int, providers=()) -> List[str]:
+    header = ["start_bit", "end_bit", "entropy_bits_per_bit", "p1", "entropy_zscore"]
+    header += [f"mi_lag{k}" for k in range(1, maxlag + 1)]
+    header += ["compression_ratio"]
+    for provider in providers:
+        header += provider.columns
+    header += ["flagged"]
+    return header
+
+
+def format_row(start: int, end: int, h: float, p1: float, mi: List[float], cr: float,
+               zscore: float, z: float, cratio: float, providers=()) -> list:
+    # providers (RandomnessBattery, LinearComplexity) add their columns
+    # before flagged; each one's cells(start, end) also says whether the
+    # window is flagged on its account.
+    flagged = (zscore <= -abs(z)) or (cr <= cratio)
+    row = ([start, end, f"{h:.6f}", f"{p1:.6f}", f"{zscore:.3f}"]
+           + [f"{x:.6f}" for x in mi]
+           + [f"{cr:.6f}"])
+    for provider in providers:
+        cells, flag = provider.cells(start, end)
+        row += cells
+        flagged = flagged or flag
+    return row + [int(flagged)]
+
+
+def column_providers(args, bits: PackedBits, index: Optional[PopcountIndex] = None) -> list:
+    # The optional per-window columns asked for on the command line.
+    providers = []
+    if args.nist:
+        providers.append(RandomnessBattery(bits, index, alpha=args.nist_alpha))
+    if args.linear_complexity:
+        providers.append(LinearComplexity(bits, args.lc_margin))
+    return providers
+
+
+def entropy_stats(entropies: List[float]) -> Tuple[float, float]:
+    mu = statistics.mean(entropies)
+    sd = statistics.pstdev(entropies)  # population stddev for stability
+    if sd == 0.0:
+        sd = 1e-12
+    return mu, sd
+
+
+def shared_indexes(args, bits: PackedBits, backend) -> dict:
+    # Prefix indexes from a fresh <file>.mdidx sidecar, if there is one.
+    if not isinstance(backend, PythonBackend) or not args.file or args.file == "-":
+        return {}
+    idx = load_block_index(args.file, bits, args.maxlag)
+    if idx is None:
+        return {}
+    return {"index": idx.ones, "pairs": idx.pairs}
+
+
+def run_multiscale(args, bits: PackedBits, backend) -> None:
+    # One long table, scale by scale. The popcount and pair-count indexes are
+    # built once and shared, so each extra scale adds only its own window
+    # lookups (and its zlib calls) for the Python backend.
+    scales = sorted(set(args.windows))
+    if not scales or scales[0] <= 0:
+        raise SystemExit("--windows needs positive window sizes.")
+    if len(bits) < scales[0]:
+        raise SystemExit(f"Need at least {scales[0]} bits, got {len(bits)}.")
+    shared = shared_indexes(args, bits, backend)
+    if isinstance(backend, PythonBackend) and not shared:
+        shared = {"index": PopcountIndex(bits), "pairs": PairCountIndex(bits, args.maxlag)}
+    providers = column_providers(args, bits, shared.get("index"))
+
+    out_f = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
+    try:
+        w = csv.writer(out_f)
+        w.writerow(["window_bits"] + csv_header(args.maxlag, providers))
+        for win in scales:
+            rows = list(scan_windows(bits, win, args.step, args.maxlag, backend,
+                                     args.zlib_threads, **shared))
+            if not rows:
+                continue
+            mu, sd = entropy_stats([r[2] for r in rows])
+            for (start, end, h, p1, mi, cr) in rows:
+                zscore = (h - mu) / sd
+                w.writerow([win] + format_row(start, end, h, p1, mi, cr, zscore, args.z, args.cratio,
+                                              providers))
+    finally:
+        if out_f is not sys.stdout:
+            out_f.close()
+
+
+class ScanState:
+    # What --incremental keeps next to a file as <file>.mdscan: the scan
+    # parameters, a BLAKE2 digest per hash_bytes block of input, every
+    # window's metrics and the exact entropy sums of RunningStats. A rerun
+    # rehashes the blocks, rescans only windows that overlap a changed or
+    # appended block, and updates the sums by removing the old entropies of
+    # those windows and adding the new ones.
+
+    SUFFIX = ".mdscan"
+    VERSION = 1
+    _MAGIC = b"MDSCAN\0\0"
+    # magic, version, hash_bytes, nbits, nblocks, stats n, len(sx), len(sxx)
+    _HEADER = struct.Struct("<8sIqqqqII")
+    DIGEST_SIZE = 16
+
+    def __init__(self, hash_bytes: int, nbits: int, hashes: List[bytes],
+                 rows: List[Row], stats: RunningStats, win: int, step: int, maxlag: int):
+        self.hash_bytes = hash_bytes
+        self.nbits = nbits
+        self.hashes = hashes
+        self.rows = rows
+        self.stats = stats
+        self.params = (win, step, maxlag)
+
+    @classmethod
+    def block_hashes(cls, bits: PackedBits, hash_bytes: int) -> List[bytes]:
+        data = bits.view()
+        return [hashlib.blake2b(data[i:i + hash_bytes], digest_size=cls.DIGEST_SIZE).digest()
+                for i in range(0, len(data), hash_bytes)]
+
+    def save(self, path: str) -> None:
+        n, sx, sxx = self.stats.sums()
+        bx = sx.to_bytes((sx.bit_length() + 8) // 8, "little", signed=True)
+        bxx = sxx.to_bytes((sxx.bit_length() + 8) // 8, "little", signed=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._HEADER.pack(self._MAGIC, self.VERSION, self.hash_bytes, self.nbits,
+                                      len(self.hashes), n, len(bx), len(bxx)))
+            f.write(bx)
+            f.write(bxx)
+            f.write(b"".join(self.hashes))
+            write_metrics(f, self.rows, *self.params)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ScanState":
+        with open(path, "rb") as f:
+            head = f.read(cls._HEADER.size)
+            if len(head) != cls._HEADER.size:
+                raise ValueError("truncated scan state")
+            magic, version, hash_bytes, nbits, nblocks, n, lx, lxx = cls._HEADER.unpack(head)
+            if magic != cls._MAGIC or version != cls.VERSION:
+                raise ValueError("not a current scan state")
+            sx = int.from_bytes(f.read(lx), "little", signed=True)
+            sxx = int.from_bytes(f.read(lxx), "little", signed=True)
+            raw = f.read(nblocks * cls.DIGEST_SIZE)
+            if len(raw) != nblocks * cls.DIGEST_SIZE:
+                raise ValueError("truncated scan state")
+            hashes = [raw[i:i + cls.DIGEST_SIZE] for i in range(0, len(raw), cls.DIGEST_SIZE)]
+            win, step, maxlag, rows = read_metrics(f)
+        return cls(hash_bytes, nbits, hashes, rows, RunningStats.from_sums(n, sx, sxx), win, step, maxlag)
+
+
+def incremental_scan(path: str, bits: PackedBits, win: int, step: int, maxlag: int, backend,
+                     zlib_threads: int = 0, hash_bytes: int = 1 << 16) -> Tuple[List[Row], Tuple[float, float]]:
+    # Rows and final (mean, stdev) for bits, reusing <path>.mdscan where the
+    # input and parameters allow, then saving the updated state.
+    side = path + ScanState.SUFFIX
+    hashes = ScanState.block_hashes(bits, hash_bytes)
+    total = (len(bits) - win) // step + 1
+    try:
+        old = ScanState.load(side)
+        if old.params != (win, step, maxlag) or old.hash_bytes != hash_bytes:
+            old = None
+    except (OSError, ValueError, struct.error):
+        old = None
+
+    dirty = bytearray([1]) * total
+    stats = RunningStats()
+    rows = [None] * total  # type: List[Optional[Row]]
+    if old is not None:
+        # Windows overlapping any block whose digest differs (or that is new)
+        # stay dirty; everything else is reused from the old state.
+        dirty = bytearray(total)
+        bb = hash_bytes * 8
+        for blk, digest in enumerate(hashes):
+            if blk < len(old.hashes) and old.hashes[blk] == digest:
+                continue
+            a, b = blk * bb, min(len(bits), (blk + 1) * bb)
+            for i in range(max(0, (a - win) // step + 1), min(total, (b - 1) // step + 1)):
+                dirty[i] = 1
+        for i in range(len(old.rows), total):
+            dirty[i] = 1
+        stats = old.stats
+        for i, row in enumerate(old.rows):
+            if i < total and not dirty[i]:
+                rows[i] = row
+            else:
+                stats.remove(row[2])
+
+    i = 0
+    while i < total:
+        if not dirty[i]:
+            i += 1
+            continue
+        j = i
+        while j < total and dirty[j]:
+            j += 1
+        s0 = i * step
+        sub = bits[s0:s0 + (j - i - 1) * step + win]
+        for k, (start, end, h, p1, mi, cr) in enumerate(scan_windows(sub, win, step, maxlag,
+                                                                     backend, zlib_threads)):
+            rows[i + k] = (s0 + start, s0 + end, h, p1, mi, cr)
+            stats.add(h)
+        i = j
+
+    ScanState(hash_bytes, len(bits), hashes, rows, stats, win, step, maxlag).save(side)
+    return rows, stats.final()
+
+
+class BlockIndex:
+    # Persistent block statistics for one input file, kept next to it as
+    # <file>.mdidx: the PopcountIndex and PairCountIndex prefix arrays for the
+    # whole file, plus cumulative byte histograms every hist_bits. Any
+    # [start, end) range is then answered from a few array lookups and at
+    # most two edge blocks of the (memory-mapped) input, and scans with any
+    # window/step reuse the arrays instead of counting again.
+
+    SUFFIX = ".mdidx"
+    VERSION = 1
+    _MAGIC = b"MDINDEX\0"
+    # magic, version, nbits, block_bits, maxlag, hist_bits, file size, mtime_ns
+    _HEADER = struct.Struct("<8sIqqIqqq")
+
+    def __init__(self, bits: PackedBits, maxlag: int, block_bits: int = 4096,
+                 hist_bits: int = 1 << 19):
+        if hist_bits <= 0 or hist_bits % block_bits:
+            raise ValueError("hist_bits must be a positive multiple of block_bits")
+        self.bits = bits
+        self.maxlag = maxlag
+        self.block_bits = block_bits
+        self.hist_bits = hist_bits
+        self.ones = PopcountIndex(bits, block_bits)
+        self.pairs = PairCountIndex(bits, maxlag, block_bits)
+        self._hist = array("Q")
+
+    def build(self) -> "BlockIndex":
+        last = len(self.bits) // self.block_bits
+        self.ones._extend(last)
+        self.pairs._extend(last)
+        hist = array("Q", [0] * 256)
+        counts = [0] * 256
+        hb = self.hist_bits >> 3
+        data = self.bits.buffer[self.bits.offset >> 3:(self.bits.offset + len(self.bits)) >> 3]
+        for s in range(0, len(data) - len(data) % hb, hb):
+            for b, c in Counter(bytes(data[s:s + hb])).items():
+                counts[b] += c
+            hist.extend(counts)
+        self._hist = hist
+        return self
+
+    @classmethod
+    def path_for(cls, path: str) -> str:
+        return path + cls.SUFFIX
+
+    def save(self, path: str, st: os.stat_result) -> None:
+        arrays = [self.ones._cum] + self.pairs._cum[1:] + [self._hist]
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._HEADER.pack(self._MAGIC, self.VERSION, len(self.bits), self.block_bits,
+                                      self.maxlag, self.hist_bits, st.st_size, st.st_mtime_ns))
+            for a in arrays:
+                if sys.byteorder != "little":
+                    a = array("Q", a)
+                    a.byteswap()
+                a.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, bits: PackedBits, st: os.stat_result) -> "BlockIndex":
+        # ValueError if the sidecar is missing pieces or stale for st.
+        with open(path, "rb") as f:
+            head = f.read(cls._HEADER.size)
+            if len(head) != cls._HEADER.size:
+                raise ValueError("truncated index header")
+            magic, version, nbits, block_bits, maxlag, hist_bits, size, mtime = cls._HEADER.unpack(head)
+            if magic != cls._MAGIC or version != cls.VERSION:
+                raise ValueError("not a current index file")
+            if nbits != len(bits) or size != st.st_size or mtime != st.st_mtime_ns:
+                raise ValueError("index is stale; rebuild it with the index command")
+            idx = cls(bits, maxlag, block_bits, hist_bits)
+            nblk = nbits // block_bits + 1
+            nhist = (nbits // hist_bits + 1) * 256
+            arrays = [array("Q") for _ in range(maxlag + 2)]
+            try:
+                for a in arrays[:-1]:
+                    a.fromfile(f, nblk)
+                arrays[-1].fromfile(f, nhist)
+            except EOFError:
+                raise ValueError("truncated index data")
+            if sys.byteorder != "little":
+                for a in arrays:
+                    a.byteswap()
+        idx.ones._cum = arrays[0]
+        idx.pairs._cum = [array("Q", [0] * nblk)] + arrays[1:-1]
+        idx._hist = arrays[-1]
+        return idx
+
+    def byte_histogram(self, start: int, end: int) -> List[int]:
+        # Counts of the whole bytes inside bits [start, end).
+        lo = (start + 7) >> 3
+        hi = end >> 3
+        hb = self.hist_bits >> 3
+        counts = [0] * 256
+        if hi <= lo:
+            return counts
+        a = -(-lo // hb)
+        b = hi // hb
+        data = self.bits.buffer
+        base = self.bits.offset >> 3
+        if a < b:
+            hist = self._hist
+            for v in range(256):
+                counts[v] = hist[b * 256 + v] - hist[a * 256 + v]
+            edges = ((lo, a * hb), (b * hb, hi))
+        else:
+            edges = ((lo, hi),)
+        for x, y in edges:
+            for v, c in Counter(bytes(data[base + x:base + y])).items():
+                counts[v] += c
+        return counts
+
+    def range_metrics(self, start: int, end: int,
+                      maxlag: Optional[int] = None) -> Tuple[float, float, List[float], float]:
+        # (entropy, p1, [mi_lag1..], byte_entropy) of bits [start, end).
+        if maxlag is None:
+            maxlag = self.maxlag
+        h, p1 = self.ones.entropy(start, end)
+        mi = self.pairs.mutual_information(self.ones, start, end - start, maxlag) if end > start else [0.0] * maxlag
+        counts = self.byte_histogram(start, end)
+        total = sum(counts)
+        hb = 0.0
+        for c in counts:
+            if c:
+                p = c / total
+                hb -= p * math.log2(p)
+        return h, p1, mi, hb
+
+
+def load_block_index(path: str, bits: PackedBits, maxlag: int) -> Optional[BlockIndex]:
+    # The sidecar for path if it exists, is fresh and covers maxlag.
+    side = BlockIndex.path_for(path)
+    try:
+        idx = BlockIndex.load(side, bits, os.stat(path))
+    except (OSError, ValueError):
+        return None
+    return idx if idx.maxlag >= maxlag else None
+
+
+def index_main(argv: List[str]) -> None:
+    ap = argparse.ArgumentParser(
+        prog="maxwell_monster_detector.py index",
+        description="Build <file>.mdidx, a block-statistics sidecar used by the query command and by later scans."
+    )
+    ap.add_argument("file", help="Binary file to index.")
+    ap.add_argument("--maxlag", type=int, default=8, help="Index pair counts for lags 1..maxlag (default: 8).")
+    ap.add_argument("--block-bits", type=int, default=4096, help="Block size in bits (default: 4096).")
+    ap.add_argument("--hist-bits", type=int, default=1 << 19,
+                    help="Byte-histogram block size in bits, a multiple of --block-bits (default: 524288).")
+    args = ap.parse_args(argv)
+
+    bits = open_bits(args.file)
+    try:
+        idx = BlockIndex(bits, args.maxlag, args.block_bits, args.hist_bits).build()
+    except ValueError as e:
+        raise SystemExit(str(e))
+    idx.save(BlockIndex.path_for(args.file), os.stat(args.file))
+
+
+def bit_range(s: str) -> Tuple[int, int]:
+    try:
+        a, b = s.split(":")
+        return int(a), int(b)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected START:END in bits, got {s!r}")
+
+
+def query_main(argv: List[str]) -> None:
+    ap = argparse.ArgumentParser(
+        prog="maxwell_monster_detector.py query",
+        description="Entropy, p1, MI and byte entropy of bit ranges, answered from <file>.mdidx."
+    )
+    ap.add_argument("file", help="Indexed binary file.")
+    ap.add_argument("ranges", nargs="+", type=bit_range, metavar="START:END", help="Bit ranges [START, END).")
+    ap.add_argument("--maxlag", type=int, help="Report lags 1..maxlag (default: all indexed lags).")
+    ap.add_argument("--csv", default="-", help="Output CSV path, or '-' for stdout (default).")
+    args = ap.parse_args(argv)
+
+    bits = open_bits(args.file)
+    try:
+        idx = BlockIndex.load(BlockIndex.path_for(args.file), bits, os.stat(args.file))
+    except OSError:
+        raise SystemExit(f"no index for {args.file}; build it with the index command")
+    except ValueError as e:
+        raise SystemExit(f"{BlockIndex.path_for(args.file)}: {e}")
+    maxlag = idx.maxlag if args.maxlag is None else args.maxlag
+    if maxlag > idx.maxlag:
+        raise SystemExit(f"index only covers lags 1..{idx.maxlag}")
+
+    out_f = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
+    try:
+        w = csv.writer(out_f)
+        w.writerow(["start_bit", "end_bit", "entropy_bits_per_bit", "p1"]
+                   + [f"mi_lag{k}" for k in range(1, maxlag + 1)] + ["byte_entropy"])
+        for start, end in args.ranges:
+            if not 0 <= start <= end <= len(bits):
+                raise SystemExit(f"range {start}:{end} outside 0:{len(bits)}")
+            h, p1, mi, hb = idx.range_metrics(start, end, maxlag)
+            w.writerow([start, end, f"{h:.6f}", f"{p1:.6f}"] + [f"{x:.6f}" for x in mi] + [f"{hb:.6f}"])
+    finally:
+        if out_f is not sys.stdout:
+            out_f.close()
+
+
+def autocorr_main(argv: List[str]) -> None:
+    ap = argparse.ArgumentParser(
+        prog="maxwell_monster_detector.py autocorr",
+        description="Strongest autocorrelation lags over all lags up to N/2, from one transform per window "
+                    "(or per file), with each lag's correlation, z-score and mutual information."
+    )
+    ap.add_argument("file", help="Binary file, or '-' for stdin.")
+    ap.add_argument("--window", type=int,
+                    help="Report every window of this many bits (default: the whole file as one window).")
+    ap.add_argument("--step", type=int, default=2048, help="Step between windows in bits (default: 2048).")
+    ap.add_argument("--maxlag", type=int,
+                    help="Largest lag (default: half the window). Smaller values also bound time and memory "
+                         "for a whole file.")
+    ap.add_argument("--top", type=int, default=5, help="Lags to report per window (default: 5).")
+    ap.add_argument("--backend", choices=BACKENDS, default="auto",
+                    help="numpy for an rfft, python for an exact decimal transform (default: numpy if importable).")
+    ap.add_argument("--csv", default="-", help="Output CSV path, or '-' for stdout (default).")
+    args = ap.parse_args(argv)
+
+    if (args.window is not None and args.window <= 0) or args.step <= 0:
+        raise SystemExit("--window and --step must be positive.")
+    if args.top < 1:
+        raise SystemExit("--top must be at least 1.")
+    try:
+        backend = get_backend(args.backend)
+    except ImportError:
+        raise SystemExit("--backend numpy requested but NumPy is not installed.")
+    np = getattr(backend, "np", None)
+    bits = open_bits(args.file)
+    win = args.window or len(bits)
+    if win < 2 or len(bits) < win:
+        raise SystemExit(f"Need at least {max(win, 2)} bits, got {len(bits)}.")
+    maxlag = win // 2 if args.maxlag is None else args.maxlag
+    if maxlag < 1:
+        raise SystemExit("--maxlag must be at least 1.")
+
+    out_f = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
+    try:
+        w = csv.writer(out_f)
+        w.writerow(["start_bit", "end_bit", "rank", "lag", "correlation", "zscore", "mi"])
+        for start in range(0, len(bits) - win + 1, args.step if args.window else win):
+            end = start + win
+            counts = autocorrelation(bits, start, end, maxlag, np)
+            for rank, (lag, rho, z, mi) in enumerate(strongest_lags(bits, start, end, counts, args.top), 1):
+                w.writerow([start, end, rank, lag, f"{rho:.6f}", f"{z:.3f}", f"{mi:.6f}"])
+    finally:
+        if out_f is not sys.stdout:
+            out_f.close()
+
+
+def period_main(argv: List[str]) -> None:
+    ap = argparse.ArgumentParser(
+        prog="maxwell_monster_detector.py period",
+        description="Dominant bit and byte periods (record strides, repeats, tables) per region and for the "
+                    "whole file, with the per-phase entropy of the data folded at each period. One pass over "
+                    "the (memory-mapped) input."
+    )
+    ap.add_argument("file", help="Binary file, or '-' for stdin.")
+    ap.add_argument("--region", type=int, default=1 << 20, help="Region size in bytes (default: 1048576).")
+    ap.add_argument("--sample", type=int, default=1 << 16,
+                    help="Bytes at the start of each region whose autocorrelation picks the periods "
+                         "(default: 65536). Folds always cover the whole region.")
+    ap.add_argument("--max-period", type=int, default=4096,
+                    help="Longest byte period searched; bit periods go up to 8x this (default: 4096).")
+    ap.add_argument("--min-z", type=float, default=8.0,
+                    help="Report a period only if its lag z-score reaches this (default: 8).")
+    ap.add_argument("--backend", choices=BACKENDS, default="auto",
+                    help="numpy for an rfft, python for an exact decimal transform (default: numpy if importable).")
+    ap.add_argument("--csv", default="-", help="Output CSV path, or '-' for stdout (default).")
+    ap.add_argument("--phases", metavar="PATH",
+                    help="Also write the whole-file per-phase counts and entropies to PATH.")
+    args = ap.parse_args(argv)
+
+    if args.max_period < 1 or args.region < 1:
+        raise SystemExit("--max-period and --region must be positive.")
+    maxlag = 8 * args.max_period + 1  # one past the longest period, to see it peak
+    if args.sample * 8 <= 2 * maxlag:
+        raise SystemExit("--sample must be more than twice --max-period.")
+    try:
+        backend = get_backend(args.backend)
+    except ImportError:
+        raise SystemExit("--backend numpy requested but NumPy is not installed.")
+    np = getattr(backend, "np", None)
+    bits = open_bits(args.file)
+    data = bits.buffer
+    size = len(data)
+    if not size:
+        raise SystemExit("Empty input.")
+
+    # Whole-file lag sums, and the byte folds kept for the whole file: one
+    # per fold period that some region or the running whole-file sums found
+    # (at most max_tracked). A fold covers the regions from the one where its
+    # period turned up onwards, which folded_bytes reports.
+    max_tracked = 8
+    total_counts = [0] * (maxlag + 1)
+    total_pairs = [0] * (maxlag + 1)
+    tracked = {}
+
+    def periods(counts, pairs):
+        ones, n = counts[0], pairs[0]
+        if ones in (0, n):
+            return [("bit", 1, 1.0, math.inf), ("byte", 1, 1.0, math.inf)]
+        z = lag_zscores(counts, pairs, ones, n)
+        out = []
+        for unit, step in (("bit", 1), ("byte", 8)):
+            period = dominant_period(z, step, args.min_z)
+            if period is None:
+                out.append((unit, None, None, None))
+            else:
+                k = period * step
+                out.append((unit, period, z[k] / math.sqrt(pairs[k]), z[k]))
+        return out
+
+    def fold_cells(unit, period, folds):
+        stats = phase_entropies(folds, period if unit == "bit" else None)
+        n = sum(c for c, _ in stats)
+        return [f"{sum(c * h for c, h in stats) / n:.6f}", f"{min(h for _, h in stats):.6f}"], stats
+
+    out_f = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
+    try:
+        w = csv.writer(out_f)
+        w.writerow(["start_byte", "end_byte", "unit", "period", "correlation", "zscore",
+                    "fold_entropy", "min_phase_entropy", "folded_bytes"])
+        for off in range(0, size, args.region):
+            chunk = bytes(data[off:off + args.region])
+            sample = PackedBits(chunk[:args.sample])
+            counts = autocorrelation(sample, 0, len(sample), maxlag, np)
+            pairs = [len(sample) - k for k in range(len(counts))]
+            total_counts = list(map(add, total_counts, counts + [0] * (maxlag + 1 - len(counts))))
+            total_pairs = list(map(add, total_pairs, pairs + [0] * (maxlag + 1 - len(pairs))))
+
+            found = periods(counts, pairs)
+            wanted = {period if unit == "byte" else period_bytes(period)
+                      for unit, period, _, _ in found + periods(total_counts, total_pairs)
+                      if period is not None}
+            for q in sorted(wanted):
+                if q not in tracked and len(tracked) < max_tracked:
+                    tracked[q] = [[Counter() for _ in range(q)], 0]
+            folds = {}
+            for q in set(tracked) | wanted:
+                folds[q] = fold_bytes(chunk, q, off)
+                if q in tracked:
+                    for acc, f in zip(tracked[q][0], folds[q]):
+                        acc.update(f)
+                    tracked[q][1] += len(chunk)
+
+            for unit, period, rho, z in found:
+                row = [off, off + len(chunk), unit]
+                if period is None:
+                    w.writerow(row + [""] * 6)
+                    continue
+                cells, _ = fold_cells(unit, period, folds[period if unit == "byte" else period_bytes(period)])
+                w.writerow(row + [period, f"{rho:.6f}", f"{z:.3f}"] + cells + [len(chunk)])
+
+        phase_rows = []
+        for unit, period, rho, z in periods(total_counts, total_pairs):
+            row = [0, size, unit]
+            if period is None:
+                w.writerow(row + [""] * 6)
+                continue
+            acc = tracked.get(period if unit == "byte" else period_bytes(period))
+            if acc is None or not acc[1]:
+                w.writerow(row + [period, f"{rho:.6f}", f"{z:.3f}", "", "", 0])
+                continue
+            cells, stats = fold_cells(unit, period, acc[0])
+            w.writerow(row + [period, f"{rho:.6f}", f"{z:.3f}"] + cells + [acc[1]])
+            phase_rows += [[unit, period, phase, c, f"{h:.6f}"] for phase, (c, h) in enumerate(stats)]
+    finally:
+        if out_f is not sys.stdout:
+            out_f.close()
+
+    if args.phases:
+        with open(args.phases, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["unit", "period", "phase", "count", "entropy"])
+            w.writerows(phase_rows)
+
+
+def segment_main(argv: List[str]) -> None:
+    ap = argparse.ArgumentParser(
+        prog="maxwell_monster_detector.py segment",
+        description="Split the input at change points in bit density and lag-1 pair statistics and report "
+                    "metrics per variable-length segment, instead of per fixed window."
+    )
+    ap.add_argument("file", help="Binary file, or '-' for stdin.")
+    ap.add_argument("--penalty", type=float,
+                    help="Minimum cost drop (nats) for a change point (default: 4 ln n). Lower finds more.")
+    ap.add_argument("--min-bits", type=int, default=128, help="Shortest segment in bits (default: 128).")
+    ap.add_argument("--grid", type=int, default=256,
+                    help="Coarse split search step in bits, a multiple of 8; splits are then placed to the "
+                         "bit (default: 256).")
+    ap.add_argument("--maxlag", type=int, default=8, help="Compute MI for lags 1..maxlag (default: 8).")
+    ap.add_argument("--z", type=float, default=3.0, help="Flag if |p1 z-score| >= z (default: 3.0).")
+    ap.add_argument("--cratio", type=float, default=0.98,
+                    help="Also flag if compression_ratio <= cratio (default: 0.98).")
+    ap.add_argument("--csv", default="-", help="Output CSV path, or '-' for stdout (default).")
+    args = ap.parse_args(argv)
+
+    bits = open_bits(args.file)
+    if len(bits) < 2:
+        raise SystemExit(f"Need at least 2 bits, got {len(bits)}.")
+    try:
+        seg = Segmenter(bits, args.penalty, args.grid, args.min_bits)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    cuts = seg.segments()
+    pairs = PairCountIndex(bits, args.maxlag)
+
+    out_f = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
+    try:
+        w = csv.writer(out_f)
+        w.writerow(["start_bit", "end_bit", "length_bits", "entropy_bits_per_bit", "p1", "p1_zscore"]
+                   + [f"mi_lag{k}" for k in range(1, args.maxlag + 1)] + ["compression_ratio", "flagged"])
+        for start, end in zip(cuts, cuts[1:]):
+            n = end - start
+            ones = seg.ones.ones(start, end)
+            h, p1 = entropy_from_counts(ones, n)
+            z = (2 * ones - n) / math.sqrt(n)
+            mi = pairs.mutual_information(seg.ones, start, n, args.maxlag)
+            cr = compress_ratio_bytes(bits[start:end])
+            flagged = abs(z) >= args.z or cr <= args.cratio
+            w.writerow([start, end, n, f"{h:.6f}", f"{p1:.6f}", f"{z:.3f}"]
+                       + [f"{x:.6f}" for x in mi] + [f"{cr:.6f}", int(flagged)])
+    finally:
+        if out_f is not sys.stdout:
+            out_f.close()
+
+
+def write_csv(path: str, rows: List[Row], entropies: List[float], maxlag: int,
+              z: float, cratio: float, stats: Optional[Tuple[float, float]] = None,
+              providers=()) -> None:
+    # stats is a precomputed (mean, stdev) of entropies, e.g. from RunningStats.final().
+    # providers over the scanned bits add their columns to every row.
+    mu, sd = entropy_stats(entropies) if stats is None else stats
+
+    out_f = sys.stdout if path == "-" else open(path, "w", newline="")
+    try:
+        w = csv.writer(out_f)
+        w.writerow(csv_header(maxlag, providers))
+
+        for (start, end, h, p1, mi, cr) in rows:
+            zscore = (h - mu) / sd
+            w.writerow(format_row(start, end, h, p1, mi, cr, zscore, z, cratio, providers))
+    finally:
+        if out_f is not sys.stdout:
+            out_f.close()
+
+
+def record_struct(maxlag: int) -> struct.Struct:
+    # Fixed-size binary record for one window: start, h, p1, mi[1..maxlag], cr.
+    return struct.Struct(f"<q{maxlag + 3}d")
+
+
+# Bump whenever a change to the metric code would alter stored values.
+METRICS_VERSION = 1
+
+# Metrics file: magic, version, window, step, maxlag, then one record_struct
+# record per window. Floats are stored as doubles, so a CSV rendered from a
+# metrics file is identical to one rendered from a fresh scan.
+_METRICS_MAGIC = b"MDMETRIC"
+_METRICS_HEADER = struct.Struct("<8sIqqI")
+
+
+def write_metrics(f, rows: List[Row], win: int, step: int, maxlag: int) -> None:
+    rec = record_struct(maxlag)
+    f.write(_METRICS_HEADER.pack(_METRICS_MAGIC, METRICS_VERSION, win, step, maxlag))
+    for start, _, h, p1, mi, cr in rows:
+        f.write(rec.pack(start, h, p1, *mi, cr))
+
+
+def _read_metrics_body(f) -> Tuple[int, int, int, bytes]:
+    head = f.read(_METRICS_HEADER.size)
+    if len(head) != _METRICS_HEADER.size:
+        raise ValueError("truncated metrics header")
+    magic, version, win, step, maxlag = _METRICS_HEADER.unpack(head)
+    if magic != _METRICS_MAGIC:
+        raise ValueError("not a metrics file")
+    if version != METRICS_VERSION:
+        raise ValueError(f"metrics version {version}, expected {METRICS_VERSION}")
+    data = f.read()
+    if len(data) % record_struct(maxlag).size:
+        raise ValueError("truncated metrics records")
+    return win, step, maxlag, data
+
+
+def read_metrics(f) -> Tuple[int, int, int, List[Row]]:
+    # (window, step, maxlag, rows); ValueError if f is not a current metrics file.
+    win, step, maxlag, data = _read_metrics_body(f)
+    rows = [(start, start + win, h, p1, rest[:-1], rest[-1])
+            for start, h, p1, *rest in record_struct(maxlag).iter_unpack(data)]
+    return win, step, maxlag, rows
+
+
+def read_metric_columns(f) -> Tuple[List[float], List[float]]:
+    # Just the entropy and compression-ratio columns, without building rows.
+    # Every record field is 8 bytes, so on little-endian hosts the records
+    # are read as one strided array of doubles.
+    win, step, maxlag, data = _read_metrics_body(f)
+    if sys.byteorder != "little":
+        recs = list(record_struct(maxlag).iter_unpack(data))
+        return [r[1] for r in recs], [r[-1] for r in recs]
+    width = maxlag + 4
+    col = memoryview(data).cast("d")
+    return col[1::width].tolist(), col[width - 1::width].tolist()
+
+
+class ResultCache:
+    # Per-window metrics on disk, keyed by the input's SHA-256 and the scan
+    # parameters. Entries are written to a temp file and renamed into place,
+    # so concurrent scanners only ever see whole entries. Hits refresh the
+    # entry's mtime, and after each store the oldest entries are removed
+    # until the directory fits in max_bytes (LRU by mtime).
+
+    SUFFIX = ".mdm"
+
+    def __init__(self, root: str, max_bytes: int = 1 << 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def digest(bits: PackedBits) -> str:
+        h = hashlib.sha256()
+        data = bits.view()
+        if isinstance(data, memoryview):
+            for i in range(0, len(data), 1 << 20):
+                h.update(data[i:i + (1 << 20)])
+        else:
+            h.update(data)
+        return h.hexdigest()
+
+    @staticmethod
+    def key(digest: str, nbits: int, win: int, step: int, maxlag: int) -> str:
+        return f"{digest}-{nbits}-w{win}-s{step}-l{maxlag}-v{METRICS_VERSION}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + self.SUFFIX)
+
+    def get(self, key: str) -> Optional[List[Row]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                rows = read_metrics(f)[3]
+            os.utime(path)
+        except (OSError, ValueError, struct.error):
+            return None
+        return rows
+
+    def put(self, key: str, rows: List[Row], win: int, step: int, maxlag: int) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write_metrics(f, rows, win, step, maxlag)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.root) as it:
+            for e in it:
+                if not e.name.endswith(self.SUFFIX):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass  # already evicted by another scanner
+            total -= size
+
+
+def run_stream(args) -> None:
+    # Rows go out as soon as each window completes, z-scored against the
+    # running mean/stdev. Every row is also spilled as a fixed-size record;
+    # if the output is a file it is rewritten from the spill at the end with
+    # z-scores against the final statistics.
+    win = args.window
+    rec = record_struct(args.maxlag)
+    stats = RunningStats()
+    f_in = sys.stdin.buffer if args.file in (None, "-") else open(args.file, "rb")
+    to_file = args.csv != "-"
+    out_f = open(args.csv, "w", newline="") if to_file else sys.stdout
+    spill = tempfile.TemporaryFile() if to_file else None
+    try:
+        w = csv.writer(out_f)
+        w.writerow(csv_header(args.maxlag))
+        for start, wbits in stream_windows(f_in, win, args.step, args.chunk_bytes):
+            h, p1 = binary_shannon_entropy(wbits)
+            mi = mutual_information_lags(wbits, args.maxlag)
+            cr = compress_ratio_bytes(wbits)
+            stats.add(h)
+            mu, sd = stats.provisional()
+            w.writerow(format_row(start, start + win, h, p1, mi, cr, (h - mu) / sd, args.z, args.cratio))
+            out_f.flush()
+            if spill is not None:
+                spill.write(rec.pack(start, h, p1, *mi, cr))
+
+        if stats.n == 0:
+            raise SystemExit(f"Need at least {win} bits.")
+        if spill is None:
+            return
+
+        # Second pass: rewrite the CSV with final z-scores from the spill.
+        mu, sd = stats.final()
+        out_f.close()
+        spill.seek(0)
+        tmp_path = args.csv + ".tmp"
+        with open(tmp_path, "w", newline="") as tmp:
+            w = csv.writer(tmp)
+            w.writerow(csv_header(args.maxlag))
+            while True:
+                block = spill.read(rec.size * 4096)
+                if not block:
+                    break
+                for start, h, p1, *rest in rec.iter_unpack(block):
+                    w.writerow(format_row(start, start + win, h, p1, rest[:-1], rest[-1],
+                                          (h - mu) / sd, args.z, args.cratio))
+        os.replace(tmp_path, args.csv)
+    finally:
+        if f_in is not sys.stdin.buffer:
+            f_in.close()
+        if out_f is not sys.stdout:
+            out_f.close()
+        if spill is not None:
+            spill.close()
+
+
+def run_follow(args) -> None:
+    # Like --stream over a file that keeps growing: each complete window is
+    # scanned as soon as its bytes land, and z-scored against the previous
+    # --baseline windows (the current one included) instead of the whole file.
+    win = args.window
+    if args.baseline < 1:
+        raise SystemExit("--baseline must be at least 1.")
+    baseline = RollingStats(args.baseline)
+    # The input is always read from its start, so the CSV is rewritten like
+    # --stream's rather than appended to (which would repeat every row).
+    out_f = open(args.csv, "w", newline="") if args.csv != "-" else sys.stdout
+    try:
+        with open(args.file, "rb", buffering=0) as f_in:
+            w = csv.writer(out_f)
+            w.writerow(csv_header(args.maxlag))
+            reader = FollowReader(f_in, args.poll)
+            for start, wbits in stream_windows(reader, win, args.step, args.chunk_bytes):
+                h, p1 = binary_shannon_entropy(wbits)
+                mi = mutual_information_lags(wbits, args.maxlag)
+                cr = compress_ratio_bytes(wbits)
+                baseline.add(h)
+                mu, sd = baseline.final()
+                w.writerow(format_row(start, start + win, h, p1, mi, cr, (h - mu) / sd, args.z, args.cratio))
+                out_f.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out_f is not sys.stdout:
+            out_f.close()
+
+
+# --- Multi-feed monitor ----------------------------------------------------
+#
+# One asyncio loop reads many byte feeds (FIFOs, Unix or TCP sockets, files)
+# at once. Each feed is windowed like --follow; window bytes go to a process
+# pool for the metrics, at most --inflight per feed, and the feed is not
+# read further until they drain, so a fast source is held back by the
+# socket/pipe buffers instead of growing memory. Rows go to one CSV per feed
+# in arrival order; flagged rows are also echoed to stdout with the feed name.
+
+def window_bytes_metrics(data: bytes, offset: int, win: int,
+                         maxlag: int) -> Tuple[float, float, List[float], float]:
+    # (entropy, p1, mi, compression_ratio) of the win bits at bit offset in
+    # data. Module-level so it can run in a worker process.
+    wbits = PackedBits(data, offset, win)
+    h, p1 = binary_shannon_entropy(wbits)
+    return h, p1, mutual_information_lags(wbits, maxlag), compress_ratio_bytes(wbits)
+
+
+class _FileFeed:
+    # StreamReader-like read() for regular files, which the event loop cannot
+    # poll; reads run in the default thread pool.
+
+    def __init__(self, f):
+        self.f = f
+
+    async def read(self, n: int) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(None, self.f.read, n)
+
+    def close(self) -> None:
+        self.f.close()
+
+
+async def open_feed(spec: str, limit: int):
+    # unix:PATH, tcp:HOST:PORT, or a path (FIFO, character device or file).
+    if spec.startswith("unix:"):
+        reader, writer = await asyncio.open_unix_connection(spec[5:], limit=limit)
+        return reader, writer.close
+    if spec.startswith("tcp:"):
+        host, _, port = spec[4:].rpartition(":")
+        reader, writer = await asyncio.open_connection(host, int(port), limit=limit)
+        return reader, writer.close
+    if stat.S_ISREG(os.stat(spec).st_mode):
+        feed = _FileFeed(open(spec, "rb"))
+        return feed, feed.close
+    loop = asyncio.get_running_loop()
+    f = os.fdopen(os.open(spec, os.O_RDONLY | os.O_NONBLOCK), "rb", buffering=0)
+    reader = asyncio.StreamReader(limit=limit)
+    transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), f)
+    return reader, transport.close
+
+
+async def astream_windows(reader, win: int, step: int, chunk_size: int):
+    # Async stream_windows(): (start, window bytes, bit offset into them).
+    buf = b""
+    base = 0
+    start = 0
+    while True:
+        while len(buf) * 8 < start + win - base:
+            chunk = await reader.read(chunk_size)
+            if not chunk:
+                return
+            drop = min(len(buf), (start - base) >> 3)
+            buf = buf[drop:] + chunk
+            base += drop * 8
+        rel = start - base
+        yield start, buf[rel >> 3:(rel + win + 7) >> 3], rel & 7
+        start += step
+
+
+def feed_label(spec: str) -> str:
+    if "=" in spec.split(":", 1)[0]:
+        return spec.split("=", 1)[0]
+    name = spec.split(":", 1)[1] if spec.startswith(("unix:", "tcp:")) else spec
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", os.path.basename(name.rstrip("/")) or name).strip("_") or "feed"
+
+
+async def monitor_feed(label: str, spec: str, args, executor, flags_w) -> int:
+    # Scans one feed to EOF; returns the number of windows.
+    loop = asyncio.get_running_loop()
+    win = args.window
+    baseline = RollingStats(args.baseline)
+    pending = deque()
+    count = 0
+    reader, close = await open_feed(spec, args.chunk_bytes)
+    out_f = open(os.path.join(args.outdir, label + ".csv"), "w", newline="")
+    try:
+        w = csv.writer(out_f)
+        w.writerow(csv_header(args.maxlag))
+
+        async def emit() -> None:
+            start, fut = pending.popleft()
+            h, p1, mi, cr = await fut
+            baseline.add(h)
+            mu, sd = baseline.final()
+            row = format_row(start, start + win, h, p1, mi, cr, (h - mu) / sd, args.z, args.cratio)
+            w.writerow(row)
+            out_f.flush()
+            if row[-1]:
+                flags_w.writerow([label] + row)
+                sys.stdout.flush()
+
+        async for start, data, offset in astream_windows(reader, win, args.step, args.chunk_bytes):
+            pending.append((start, loop.run_in_executor(executor, window_bytes_metrics,
+                                                        data, offset, win, args.maxlag)))
+            count += 1
+            if len(pending) >= args.inflight:
+                await emit()
+            while pending and pending[0][1].done():
+                await emit()
+        while pending:
+            await emit()
+    finally:
+        close()
+        out_f.close()
+    return count
+
+
+async def run_monitor(feeds: List[Tuple[str, str]], args) -> None:
+    from concurrent.futures import ProcessPoolExecutor
+
+    flags_w = csv.writer(sys.stdout)
+    flags_w.writerow(["feed"] + csv_header(args.maxlag))
+    sys.stdout.flush()
+    with ProcessPoolExecutor(args.jobs) as executor:
+        results = await asyncio.gather(*(monitor_feed(label, spec, args, executor, flags_w)
+                                         for label, spec in feeds), return_exceptions=True)
+    failed = 0
+    for (label, spec), res in zip(feeds, results):
+        if isinstance(res, BaseException):
+            failed += 1
+            print(f"monitor: {label} ({spec}): {res}", file=sys.stderr)
+    if failed:
+        raise SystemExit(1)
+
+
+def monitor_main(argv: List[str]) -> None:
+    ap = argparse.ArgumentParser(
+        prog="maxwell_monster_detector.py monitor",
+        description="Scan many byte feeds concurrently, one CSV per feed, flagged windows echoed to stdout."
+    )
+    ap.add_argument("feeds", nargs="+", metavar="[NAME=]FEED",
+                    help="unix:PATH, tcp:HOST:PORT, or a FIFO/device/file path.")
+    ap.add_argument("--outdir", default=".", help="Directory for the per-feed CSVs (default: .).")
+    ap.add_argument("--window", type=int, default=8192, help="Window size in bits (default: 8192).")
+    ap.add_argument("--step", type=int, default=2048, help="Step size in bits (default: 2048).")
+    ap.add_argument("--maxlag", type=int, default=8, help="Compute MI for lags 1..maxlag (default: 8).")
+    ap.add_argument("--z", type=float, default=3.0, help="Flag if entropy z-score <= -z (default: 3.0).")
+    ap.add_argument("--cratio", type=float, default=0.98,
+                    help="Also flag if compression_ratio <= cratio (default: 0.98).")
+    ap.add_argument("--baseline", type=int, default=1024,
+                    help="Windows in each feed's rolling z-score baseline (default: 1024).")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                    help="Worker processes for the metrics (default: CPU count).")
+    ap.add_argument("--inflight", type=int, default=64,
+                    help="Windows per feed in the pool before reading pauses (default: 64).")
+    ap.add_argument("--chunk-bytes", type=int, default=1 << 16, help="Read size per feed (default: 65536).")
+    args = ap.parse_args(argv)
+    if args.window <= 0 or args.step <= 0:
+        raise SystemExit("--window and --step must be positive.")
+    if args.jobs < 1 or args.inflight < 1 or args.baseline < 1:
+        raise SystemExit("--jobs, --inflight and --baseline must be at least 1.")
+
+    feeds = []
+    for spec in args.feeds:
+        label = feed_label(spec)
+        if "=" in spec.split(":", 1)[0]:
+            spec = spec.split("=", 1)[1]
+        feeds.append((label, spec))
+    labels = [label for label, _ in feeds]
+    if len(set(labels)) != len(labels):
+        raise SystemExit("feed names must be unique; use NAME=FEED to tell them apart.")
+    os.makedirs(args.outdir, exist_ok=True)
+    try:
+        asyncio.run(run_monitor(feeds, args))
+    except KeyboardInterrupt:
+        pass
+
+
+# --- Batch scanning --------------------------------------------------------
+#
+# One pool scans a whole corpus. Every file's windows are cut into pieces of
+# about the same number of windows: big files are split into several pieces,
+# small files are packed together into one task, and tasks are handed out
+# largest first. A file's CSV is written as soon as its last piece is back.
+
+def batch_inputs(pattern: str) -> List[str]:
+    # A directory means every *.bin in it; anything else is a glob.
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.bin")
+    return sorted(p for p in glob.glob(pattern) if os.path.isfile(p))
+
+
+def plan_batch(sizes: List[Tuple[str, int]], win: int, step: int,
+               ntasks: int) -> List[List[Tuple[str, int, int]]]:
+    # sizes holds (path, nbits). Returns tasks, each a list of
+    # (path, first_window, window_count) pieces, largest task first.
+    counts = [(path, (nbits - win) // step + 1) for path, nbits in sizes if nbits >= win]
+    total = sum(c for _, c in counts)
+    if total == 0:
+        return []
+    target = max(1, -(-total // max(1, ntasks)))
+    tasks = []
+    small = []
+    small_windows = 0
+    for path, count in counts:
+        if count >= target:
+            nshards = -(-count // target)
+            tasks.extend([[(path, first, n)] for first, n in
+                          shard_ranges((count - 1) * step + win, win, step, nshards)])
+            continue
+        small.append((path, 0, count))
+        small_windows += count
+        if small_windows >= target:
+            tasks.append(small)
+            small = []
+            small_windows = 0
+    if small:
+        tasks.append(small)
+    tasks.sort(key=lambda t: -sum(n for _, _, n in t))
+    return tasks
+
+
+def _init_batch_worker(backend_name: str, win: int, step: int, maxlag: int,
+                       zlib_threads: int = 0) -> None:
+    _worker["backend"] = get_backend(backend_name)
+    _worker["params"] = (win, step, maxlag, zlib_threads)
+
+
+def _scan_batch_task(task: List[Tuple[str, int, int]]) -> List[Tuple[str, int, List[Row]]]:
+    win, step, maxlag, zlib_threads = _worker["params"]
+    out = []
+    for path, first, count in task:
+        bits = open_bits(path)
+        s0 = first * step
+        sub = bits[s0:s0 + (count - 1) * step + win]
+        rows = [(s0 + start, s0 + end, h, p1, mi, cr)
+                for start, end, h, p1, mi, cr in scan_windows(sub, win, step, maxlag,
+                                                               _worker["backend"], zlib_threads)]
+        out.append((path, first, rows))
+        del bits, sub
+    return out
+
+
+def batch_csv_path(path: str, outdir: Optional[str]) -> str:
+    out = os.path.splitext(path)[0] + ".csv"
+    if outdir:
+        out = os.path.join(outdir, os.path.basename(out))
+    return out
+
+
+def run_batch(args) -> None:
+    paths = batch_inputs(args.batch)
+    if not paths:
+        raise SystemExit(f"--batch matched no files: {args.batch}")
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+
+    win, step = args.window, args.step
+    cache = ResultCache(args.cache_dir, args.cache_max_mb << 20) if args.cache_dir else None
+    keys = {}
+    sizes = []
+    for path in paths:
+        nbits = os.path.getsize(path) * 8
+        if nbits < win:
+            print(f"skipping {path}: need at least {win} bits, got {nbits}", file=sys.stderr)
+            continue
+        if cache is not None:
+            keys[path] = key = cache.key(cache.digest(open_bits(path)), nbits, win, step, args.maxlag)
+            rows = cache.get(key)
+            if rows is not None:
+                write_csv(batch_csv_path(path, args.outdir), rows, [r[2] for r in rows],
+                          args.maxlag, args.z, args.cratio)
+                continue
+        sizes.append((path, nbits))
+    tasks = plan_batch(sizes, win, step, args.jobs * 4)
+
+    # Pieces still outstanding per file, and the ones already back.
+    remaining = {}
+    for task in tasks:
+        for path, _, _ in task:
+            remaining[path] = remaining.get(path, 0) + 1
+    done = {}
+
+    initargs = (args.backend, win, step, args.maxlag, args.zlib_threads)
+    if args.jobs > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(args.jobs, _init_batch_worker, initargs)
+        results = pool.imap_unordered(_scan_batch_task, tasks)
+    else:
+        pool = None
+        _init_batch_worker(*initargs)
+        results = map(_scan_batch_task, tasks)
+    try:
+        for pieces in results:
+            for path, first, rows in pieces:
+                done.setdefault(path, []).append((first, rows))
+                remaining[path] -= 1
+                if remaining[path]:
+                    continue
+                rows = [r for _, part in sorted(done.pop(path), key=lambda x: x[0]) for r in part]
+                if cache is not None:
+                    cache.put(keys[path], rows, win, step, args.maxlag)
+                write_csv(batch_csv_path(path, args.outdir), rows, [r[2] for r in rows],
+                          args.maxlag, args.z, args.cratio)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+# --- Scan daemon -----------------------------------------------------------
+#
+# serve keeps the interpreter, the metric backend, a worker pool and the
+# result caches warm and answers scan requests over HTTP, on localhost TCP or
+# a Unix socket, one thread per request:
+#
+#   GET  /health
+#   GET  /scan?path=P[&offset=BYTES&length=BYTES][&window=..&step=..&maxlag=..&z=..&cratio=..]
+#   POST /scan   JSON body with the same fields, or the raw bytes to scan
+#                (parameters then go in the query string)
+#
+# Answers are JSON (summary plus rows) or, with format=csv, the scan CSV
+# streamed row by row. Small scans run in the request thread; scans of a
+# file with many windows are sharded over the warm pool.
+
+class ScanService:
+    SCAN_PARAMS = {"window": (int, 8192), "step": (int, 2048), "maxlag": (int, 8),
+                   "z": (float, 3.0), "cratio": (float, 0.98)}
+
+    def __init__(self, backend_name: str = "auto", jobs: int = 1, cache: Optional[ResultCache] = None,
+                 memory_entries: int = 256, pool_windows: int = 4096):
+        self.backend = get_backend(backend_name)
+        self.cache = cache
+        self.memory_entries = memory_entries
+        self.pool_windows = pool_windows
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.jobs = jobs
+        self.pool = None
+        if jobs > 1:
+            import multiprocessing
+            self.pool = multiprocessing.Pool(jobs, _init_serve_worker, (self.backend.name,))
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+
+    @classmethod
+    def params(cls, fields: dict) -> dict:
+        # Scan parameters from request fields; ValueError on bad input.
+        out = {}
+        for name, (kind, default) in cls.SCAN_PARAMS.items():
+            if kind is int:
+                out[name] = _field_int(fields, name, default)
+                continue
+            v = fields.get(name, default)
+            if isinstance(v, bool) or not isinstance(v, (int, float, str)):
+                raise ValueError(f"{name} must be a number")
+            out[name] = float(v)
+        if out["window"] <= 0 or out["step"] <= 0 or out["maxlag"] < 0:
+            raise ValueError("window and step must be positive and maxlag non-negative")
+        return out
+
+    def _remember(self, key: str, rows: Optional[List[Row]] = None) -> Optional[List[Row]]:
+        with self._lock:
+            if rows is None:
+                rows = self._memory.get(key)
+                if rows is not None:
+                    self._memory.move_to_end(key)
+                return rows
+            self._memory[key] = rows
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+            return rows
+
+    def scan(self, bits: PackedBits, p: dict, path: Optional[str] = None,
+             bit_offset: int = 0) -> List[Row]:
+        # Rows for bits, which are bits [bit_offset, bit_offset + len) of path
+        # when path is given. Starts are relative to bits.
+        win, step, maxlag = p["window"], p["step"], p["maxlag"]
+        if len(bits) < win:
+            raise ValueError(f"need at least {win} bits, got {len(bits)}")
+        key = ResultCache.key(ResultCache.digest(bits), len(bits), win, step, maxlag)
+        rows = self._remember(key)
+        if rows is None and self.cache is not None:
+            rows = self.cache.get(key)
+        if rows is not None:
+            return self._remember(key, rows)
+
+        total = (len(bits) - win) // step + 1
+        if self.pool is not None and path is not None and total >= self.pool_windows:
+            tasks = [(path, bit_offset, first, count, win, step, maxlag)
+                     for first, count in shard_ranges(len(bits), win, step, self.jobs * 4)]
+            rows = [r for part in self.pool.imap(_scan_serve_piece, tasks) for r in part]
+        else:
+            rows = list(scan_windows(bits, win, step, maxlag, self.backend))
+        if self.cache is not None:
+            self.cache.put(key, rows, win, step, maxlag)
+        return self._remember(key, rows)
+
+
+def _init_serve_worker(backend_name: str) -> None:
+    _worker["backend"] = get_backend(backend_name)
+
+
+def _scan_serve_piece(task: tuple) -> List[Row]:
+    path, bit_offset, first, count, win, step, maxlag = task
+    s0 = first * step
+    lo = bit_offset + s0
+    sub = open_bits(path)[lo:lo + (count - 1) * step + win]
+    return [(s0 + start, s0 + end, h, p1, mi, cr)
+            for start, end, h, p1, mi, cr in scan_windows(sub, win, step, maxlag, _worker["backend"])]
+
+
+def open_regular_bits(path: str) -> PackedBits:
+    # Like open_bits, but only for regular files, always mapped. The open is
+    # non-blocking so a FIFO without a writer cannot hang the caller, and
+    # FIFOs and devices (/dev/zero) are refused rather than read to the end.
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_NONBLOCK", 0))
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            raise ValueError(f"{path} is not a regular file")
+        if st.st_size == 0:
+            return PackedBits(b"")
+        return PackedBits(mmap.mmap(fd, 0, access=mmap.ACCESS_READ))
+    finally:
+        os.close(fd)
+
+
+def _field_int(fields: dict, name: str, default: Optional[int]) -> Optional[int]:
+    # An int request field given as an int or a decimal string (query
+    # strings and JSON bodies); ValueError for anything else.
+    v = fields.get(name, default)
+    if v is None or (isinstance(v, int) and not isinstance(v, bool)):
+        return v
+    if isinstance(v, str) and v.strip().lstrip("+-").isdigit():
+        return int(v)
+    raise ValueError(f"{name} must be an integer")
+
+
+class ScanRequestHandler(BaseHTTPRequestHandler):
+    server_version = "MaxwellDemonDetector/1"
+    protocol_version = "HTTP/1.1"
+    service = None  # type: ScanService
+    verbose = False
+    max_body = 256 << 20
+
+    def address_string(self) -> str:
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, fmt, *args) -> None:
+        if self.verbose:
+            super().log_message(fmt, *args)
+
+    def _send(self, code: int, body: bytes, ctype: str = "application/json") -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, code: int, obj) -> None:
+        self._send(code, json.dumps(obj).encode())
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._json(200, {"status": "ok", "backend": self.service.backend.name})
+        elif url.path == "/scan":
+            self._scan(dict(parse_qsl(url.query)), None)
+        else:
+            self._json(404, {"error": f"no such endpoint: {url.path}"})
+
+    def do_POST(self) -> None:
+        url = urlsplit(self.path)
+        if url.path != "/scan":
+            self._json(404, {"error": f"no such endpoint: {url.path}"})
+            return
+        length = self.headers.get("Content-Length")
+        if length is None and self.headers.get("Transfer-Encoding"):
+            self.close_connection = True
+            self._json(411, {"error": "POST bodies need a Content-Length"})
+            return
+        length = (length or "0").strip()
+        if not length.isdigit():
+            self.close_connection = True
+            self._json(400, {"error": "invalid Content-Length"})
+            return
+        if int(length) > self.max_body:
+            self.close_connection = True
+            self._json(413, {"error": f"body larger than {self.max_body} bytes"})
+            return
+        body = self.rfile.read(int(length))
+        fields = dict(parse_qsl(url.query))
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                obj = json.loads(body or b"{}")
+            except ValueError:
+                self._json(400, {"error": "invalid JSON body"})
+                return
+            if not isinstance(obj, dict):
+                self._json(400, {"error": "JSON body must be an object"})
+                return
+            fields.update(obj)
+            body = None
+        self._scan(fields, body)
+
+    def _scan(self, fields: dict, payload: Optional[bytes]) -> None:
+        try:
+            p = ScanService.params(fields)
+            path = None
+            bit_offset = 0
+            if payload is not None:
+                bits = PackedBits(payload)
+            elif "path" in fields:
+                # A JSON body can carry any type; an int path would make open()
+                # wrap (and then close) one of the daemon's own descriptors.
+                path = fields["path"]
+                if not isinstance(path, str) or not path:
+                    raise ValueError("path must be a non-empty string")
+                offset = _field_int(fields, "offset", 0)
+                length = _field_int(fields, "length", None)
+                bits = open_regular_bits(path)
+                end = len(bits) if length is None else min(len(bits), (offset + length) * 8)
+                if offset < 0 or offset * 8 > end:
+                    raise ValueError("offset/length outside the file")
+                bit_offset = offset * 8
+                bits = bits[bit_offset:end]
+            else:
+                raise ValueError("give a path or POST the bytes to scan")
+            rows = self.service.scan(bits, p, path, bit_offset)
+        except (ValueError, TypeError) as e:
+            self._json(400, {"error": str(e)})
+            return
+        except OSError as e:
+            self._json(404, {"error": str(e)})
+            return
+
+        mu, sd = entropy_stats([r[2] for r in rows])
+        out = [format_row(start, end, h, p1, mi, cr, (h - mu) / sd, p["z"], p["cratio"])
+               for start, end, h, p1, mi, cr in rows]
+        if fields.get("format") == "csv":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            buf = io.StringIO()
+            w = csv.writer(buf)
+            w.writerow(csv_header(p["maxlag"]))
+            for i, row in enumerate(out):
+                w.writerow(row)
+                if i % 256 == 255 or i == len(out) - 1:
+                    data = buf.getvalue().encode()
+                    buf.seek(0)
+                    buf.truncate()
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        self._json(200, {"windows": len(out), "flagged": sum(r[-1] for r in out),
+                         "entropy_mean": mu, "entropy_stdev": sd,
+                         "columns": csv_header(p["maxlag"]), "rows": out})
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_main(argv: List[str]) -> None:
+    ap = argparse.ArgumentParser(
+        prog="maxwell_monster_detector.py serve",
+        description="Long-running scan daemon answering HTTP requests on localhost or a Unix socket."
+    )
+    where = ap.add_mutually_exclusive_group(required=True)
+    where.add_argument("--http", metavar="HOST:PORT", help="Listen on HOST:PORT, e.g. 127.0.0.1:8765.")
+    where.add_argument("--unix", metavar="PATH", help="Listen on a Unix socket at PATH.")
+    ap.add_argument("--backend", choices=BACKENDS, default="auto", help="Metric backend (default: auto).")
+    ap.add_argument("--jobs", type=int, default=1, help="Warm worker processes for large file scans (default: 1).")
+    ap.add_argument("--cache-dir", help="Also keep results in a ResultCache directory (default: memory only).")
+    ap.add_argument("--cache-max-mb", type=int, default=1024, help="Disk cache size limit (default: 1024).")
+    ap.add_argument("--memory-cache", type=int, default=256,
+                    help="Recent results kept in memory (default: 256).")
+    ap.add_argument("--max-body-mb", type=int, default=256,
+                    help="Largest POST body accepted, in MiB (default: 256).")
+    ap.add_argument("--verbose", action="store_true", help="Log every request to stderr.")
+    args = ap.parse_args(argv)
+
+    try:
+        cache = ResultCache(args.cache_dir, args.cache_max_mb << 20) if args.cache_dir else None
+        service = ScanService(args.backend, args.jobs, cache, args.memory_cache)
+    except ImportError:
+        raise SystemExit("--backend numpy requested but NumPy is not installed.")
+    handler = type("Handler", (ScanRequestHandler,), {"service": service, "verbose": args.verbose,
+                                                      "max_body": args.max_body_mb << 20})
+    if args.unix:
+        if os.path.exists(args.unix) and stat.S_ISSOCK(os.stat(args.unix).st_mode):
+            os.unlink(args.unix)
+        server = ThreadingUnixHTTPServer(args.unix, handler)
+        where = args.unix
+    else:
+        host, _, port = args.http.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), handler)
+        where = "http://%s:%d" % server.server_address[:2]
+    print(f"serving on {where}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix:
+            try:
+                os.unlink(args.unix)
+            except OSError:
+                pass
+
+
+COMMANDS = {"reflag": reflag_main, "sweep": sweep_main, "index": index_main, "query": query_main,
+            "health": health_main, "monitor": monitor_main, "serve": serve_main, "autocorr": autocorr_main,
+            "period": period_main, "segment": segment_main}
+
+
+def main(argv: Optional[List[str]] = None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in COMMANDS:
+        COMMANDS[argv[0]](argv[1:])
+        return
+
+    args = parse_args(argv)
+    if args.jobs < 1:
+        raise SystemExit("--jobs must be at least 1.")
+    if (args.nist or args.linear_complexity) and (args.follow or args.stream or args.batch):
+        raise SystemExit("--nist and --linear-complexity do not combine with --follow, --stream or --batch.")
+    if args.save_metrics and (args.follow or args.stream or args.batch):
+        raise SystemExit("--save-metrics does not combine with --follow, --stream or --batch.")
+    if args.cache_dir and (args.follow or args.stream):
+        raise SystemExit("--cache-dir does not combine with --follow or --stream.")
+    if args.incremental and (not args.file or args.file == "-" or args.jobs > 1 or args.cache_dir
+                             or args.follow or args.stream or args.windows or args.batch):
+        raise SystemExit("--incremental needs a --file path and does not combine with --jobs, --cache-dir, "
+                         "--follow, --stream, --windows or --batch.")
+    if args.follow:
+        if not args.file or args.file == "-":
+            raise SystemExit("--follow needs a --file path.")
+        if args.jobs > 1:
+            raise SystemExit("--follow runs in a single process; drop --jobs.")
+        run_follow(args)
+        return
+    if args.stream:
+        if not args.file:
+            raise SystemExit("--stream reads --file (or '-' for stdin).")
+        if args.jobs > 1:
+            raise SystemExit("--stream runs in a single process; drop --jobs.")
+        run_stream(args)
+        return
+    if args.windows:
+        if args.jobs > 1 or args.cache_dir or args.save_metrics or args.batch:
+            raise SystemExit("--windows does not combine with --jobs, --cache-dir, --save-metrics or --batch.")
+        try:
+            backend = get_backend(args.backend)
+        except ImportError:
+            raise SystemExit("--backend numpy requested but NumPy is not installed.")
+        run_multiscale(args, load_bits_from_args(args), backend)
+        return
+
+    if args.batch:
+        try:
+            get_backend(args.backend)
+        except ImportError:
+            raise SystemExit("--backend numpy requested but NumPy is not installed.")
+        run_batch(args)
+        return
+
+    bits = load_bits_from_args(args)
+
+    if len(bits) < args.window:
+        raise SystemExit(f"Need at least {args.window} bits, got {len(bits)}.")
+
+    try:
+        backend = get_backend(args.backend)
+    except ImportError:
+        raise SystemExit("--backend numpy requested but NumPy is not installed.")
+
+    cache = key = rows = stats = None
+    shared = shared_indexes(args, bits, backend)
+    if args.nist and isinstance(backend, PythonBackend) and not shared:
+        # Built up front so a serial Python scan and the battery share one index.
+        shared = {"index": PopcountIndex(bits)}
+    providers = column_providers(args, bits, shared.get("index"))
+    if args.incremental:
+        rows, stats = incremental_scan(args.file, bits, args.window, args.step, args.maxlag,
+                                       backend, args.zlib_threads)
+    elif args.cache_dir:
+        cache = ResultCache(args.cache_dir, args.cache_max_mb << 20)
+        key = cache.key(cache.digest(bits), len(bits), args.window, args.step, args.maxlag)
+        rows = cache.get(key)
+
+    if rows is None:
+        if args.jobs > 1:
+            path = args.file if args.file and isinstance(bits.buffer.obj, mmap.mmap) else None
+            scan = scan_parallel(bits, args.window, args.step, args.maxlag, backend.name, args.jobs, path,
+                                 args.zlib_threads)
+        else:
+            scan = scan_windows(bits, args.window, args.step, args.maxlag, backend, args.zlib_threads,
+                                **shared)
+
+        # First pass: gather metrics per window
+        rows = list(scan)
+        if cache is not None:
+            cache.put(key, rows, args.window, args.step, args.maxlag)
+    entropies = [row[2] for row in rows]
+
+    if args.save_metrics:
+        with open(args.save_metrics, "wb") as f:
+            write_metrics(f, rows, args.window, args.step, args.maxlag)
+
+    write_csv(args.csv, rows, entropies, args.maxlag, args.z, args.cratio, stats, providers)
+
+
+if __name__ == "__main__":
+    main()